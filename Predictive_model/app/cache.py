@@ -0,0 +1,161 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from functools import wraps
+
+from flask import Response, make_response, request
+from app.config import (
+    RESPONSE_CACHE_ENABLED, RESPONSE_CACHE_MAX_BYTES, RESPONSE_CACHE_MAX_ENTRIES, RESPONSE_CACHE_WATERMARK_TTL
+)
+from app.db import fetch_one
+from app.metrics import CACHE_REQUESTS, current_route
+
+# Cheap change markers per source table. Append-heavy tables use their max id;
+# small reference tables are hashed whole so in-place updates are noticed too.
+WATERMARK_EXPRESSIONS = {
+    "tracking_data": "(SELECT MAX(id) FROM tracking_data)",
+    "spare_replacement": "(SELECT MAX(replacement_id) FROM spare_replacement)",
+    "trip_details": "(SELECT MAX(trip_id) FROM trip_details)",
+    "alerts": "(SELECT MAX(alert_id) FROM alerts)",
+    "vehicle": "(SELECT md5(string_agg(t::text, ',' ORDER BY t::text)) FROM vehicle t)",
+    "spares_inventory_depot": "(SELECT md5(string_agg(t::text, ',' ORDER BY t::text)) FROM spares_inventory_depot t)",
+    "map_vehicle_type": "(SELECT md5(string_agg(t::text, ',' ORDER BY t::text)) FROM map_vehicle_type t)",
+    "driver_details": "(SELECT md5(string_agg(t::text, ',' ORDER BY t::text)) FROM driver_details t)",
+}
+
+
+class LRUCache:
+    def __init__(self, max_entries, max_bytes):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry):
+        size = len(entry["body"])
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.total_bytes -= len(previous["body"])
+            self._entries[key] = entry
+            self.total_bytes += size
+            while len(self._entries) > self.max_entries or self.total_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.total_bytes -= len(evicted["body"])
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.total_bytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+
+response_cache = LRUCache(RESPONSE_CACHE_MAX_ENTRIES, RESPONSE_CACHE_MAX_BYTES)
+
+_watermark_lock = threading.Lock()
+_watermarks = {}
+
+
+def get_watermark(tables):
+    tables = tuple(sorted(tables))
+    if not tables:
+        return ()
+    now = time.monotonic()
+    with _watermark_lock:
+        cached = _watermarks.get(tables)
+        if cached and now - cached[0] < RESPONSE_CACHE_WATERMARK_TTL:
+            return cached[1]
+
+    query = "SELECT " + ", ".join(f"{WATERMARK_EXPRESSIONS[table]} AS {table}" for table in tables)
+    row = fetch_one(query, replica=True, name="response_cache_watermark")
+    watermark = tuple(str(value) for value in row) if row is not None else ()
+
+    with _watermark_lock:
+        _watermarks[tables] = (now, watermark)
+    return watermark
+
+
+# Only tells the route which running job to wait on; the answer it polls for is the same as
+# for the plain URL, so it must share that URL's cache entry and ETag
+IGNORED_PARAMS = ("job_id",)
+
+
+def _normalized_params():
+    return tuple(sorted(
+        (key, value.strip()) for key, value in request.args.items(multi=True)
+        if value.strip() and key not in IGNORED_PARAMS
+    ))
+
+
+def _make_etag(key):
+    return hashlib.sha1(repr(key).encode("utf-8")).hexdigest()
+
+
+def cached_response(*tables, extra=None):
+    # tables may instead be a single callable returning them, for routes whose sources change at runtime
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if not RESPONSE_CACHE_ENABLED:
+                return view(*args, **kwargs)
+
+            route = current_route()
+            try:
+                watermark = get_watermark(tables[0]() if len(tables) == 1 and callable(tables[0]) else tables)
+            except Exception:
+                # Never fail a request because the watermark check failed; just skip the cache
+                CACHE_REQUESTS.labels(route, "bypass").inc()
+                return view(*args, **kwargs)
+
+            key = (request.path, _normalized_params(), watermark, extra() if extra else None)
+            etag = _make_etag(key)
+
+            # The ETag is derived from the key, so a match means the data has not changed
+            if request.if_none_match.contains(etag):
+                CACHE_REQUESTS.labels(route, "not_modified").inc()
+                response = Response(status=304)
+                response.set_etag(etag)
+                response.headers["Cache-Control"] = "no-cache"
+                return response
+
+            entry = response_cache.get(key)
+            if entry is None:
+                CACHE_REQUESTS.labels(route, "miss").inc()
+                response = make_response(view(*args, **kwargs))
+                # Only successful answers are cached; errors and 404s are recomputed
+                if response.status_code != 200:
+                    return response
+                entry = {
+                    "body": response.get_data(),
+                    "mimetype": response.mimetype,
+                    "last_modified": datetime.now(timezone.utc).replace(microsecond=0)
+                }
+                response_cache.set(key, entry)
+                cache_status = "MISS"
+            else:
+                CACHE_REQUESTS.labels(route, "hit").inc()
+                cache_status = "HIT"
+
+            response = Response(entry["body"], status=200, mimetype=entry["mimetype"])
+            response.set_etag(etag)
+            response.last_modified = entry["last_modified"]
+            response.headers["Cache-Control"] = "no-cache"
+            response.headers["X-Cache"] = cache_status
+            return response.make_conditional(request)
+
+        return wrapper
+    return decorator
@@ -0,0 +1,116 @@
+import logging
+import re
+import sys
+import threading
+import time
+
+import pandas as pd
+from prometheus_client import Counter, Gauge, Histogram
+from sqlalchemy import text
+from app.config import engine, replica_engine
+from app.metrics import DEFAULT_BUCKETS, collect_registry, stage
+
+logger = logging.getLogger(__name__)
+
+# Query stats are Prometheus metrics so /db-stats covers every worker process, like /metrics
+QUERY_LATENCY = Histogram(
+    "db_query_duration_seconds", "Latency per named query.", ("query", "replica"), buckets=DEFAULT_BUCKETS
+)
+QUERY_ROWS = Counter("db_query_rows_total", "Rows returned per named query.", ("query", "replica"))
+QUERY_BYTES = Counter("db_query_bytes_total", "Approximate bytes fetched per named query.", ("query", "replica"))
+QUERY_MAX_LATENCY = Gauge(
+    "db_query_max_duration_seconds", "Slowest call per named query.", ("query", "replica"), multiprocess_mode="max"
+)
+
+_max_lock = threading.Lock()
+# (name, replica) -> slowest call in this process, mirrored into QUERY_MAX_LATENCY
+_max_seconds = {}
+
+
+def get_engine(replica=False):
+    return replica_engine if replica else engine
+
+
+def _as_text(query):
+    return text(query) if isinstance(query, str) else query
+
+
+def _query_name(query, name):
+    if name:
+        return name
+    # Fall back to a collapsed prefix of the SQL so unnamed queries still group together
+    return re.sub(r"\s+", " ", str(query)).strip()[:80]
+
+
+def _record(name, started, rows, nbytes, replica):
+    elapsed = time.perf_counter() - started
+    labels = (name, str(replica).lower())
+    QUERY_LATENCY.labels(*labels).observe(elapsed)
+    QUERY_ROWS.labels(*labels).inc(rows)
+    QUERY_BYTES.labels(*labels).inc(nbytes)
+    with _max_lock:
+        if elapsed > _max_seconds.get(labels, 0.0):
+            _max_seconds[labels] = elapsed
+            QUERY_MAX_LATENCY.labels(*labels).set(elapsed)
+
+    logger.debug("query=%s replica=%s ms=%.2f rows=%d bytes=%d", name, replica, elapsed * 1000, rows, nbytes)
+
+
+def _rows_size(rows):
+    # The driver does not expose wire size, so approximate it from the fetched values
+    return sum(sys.getsizeof(value) for row in rows for value in row)
+
+
+def read_sql(query, params=None, replica=False, name=None, **kwargs):
+    query = _as_text(query)
+    started = time.perf_counter()
+    with stage("sql_fetch"), get_engine(replica).connect() as conn:
+        df = pd.read_sql(query, conn, params=params, **kwargs)
+    _record(_query_name(query, name), started, len(df), int(df.memory_usage(deep=True).sum()), replica)
+    return df
+
+
+def fetch_all(query, params=None, replica=False, name=None):
+    query = _as_text(query)
+    started = time.perf_counter()
+    with stage("sql_fetch"), get_engine(replica).connect() as conn:
+        rows = conn.execute(query, params or {}).fetchall()
+    _record(_query_name(query, name), started, len(rows), _rows_size(rows), replica)
+    return rows
+
+
+def fetch_one(query, params=None, replica=False, name=None):
+    rows = fetch_all(query, params, replica=replica, name=name)
+    return rows[0] if rows else None
+
+
+def fetch_scalar(query, params=None, replica=False, name=None):
+    row = fetch_one(query, params, replica=replica, name=name)
+    return row[0] if row is not None else None
+
+
+def get_query_stats():
+    fields = {
+        "db_query_duration_seconds_count": ("calls", 1),
+        "db_query_duration_seconds_sum": ("total_ms", 1000),
+        "db_query_max_duration_seconds": ("max_ms", 1000),
+        "db_query_rows_total": ("rows", 1),
+        "db_query_bytes_total": ("bytes", 1),
+    }
+    stats = {}
+    for family in collect_registry().collect():
+        for sample in family.samples:
+            if sample.name not in fields:
+                continue
+            field, scale = fields[sample.name]
+            entry = stats.setdefault(sample.labels["query"], {
+                "calls": 0, "total_ms": 0.0, "max_ms": 0.0, "rows": 0, "bytes": 0,
+                "replica": sample.labels["replica"] == "true"
+            })
+            entry[field] = max(entry[field], sample.value * scale) if field == "max_ms" else entry[field] + sample.value * scale
+
+    for entry in stats.values():
+        entry["calls"], entry["rows"], entry["bytes"] = int(entry["calls"]), int(entry["rows"]), int(entry["bytes"])
+        entry["total_ms"], entry["max_ms"] = round(entry["total_ms"], 2), round(entry["max_ms"], 2)
+        entry["avg_ms"] = round(entry["total_ms"] / entry["calls"], 2) if entry["calls"] else 0.0
+    return stats
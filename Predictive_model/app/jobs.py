@@ -0,0 +1,362 @@
+import inspect
+import os
+import signal
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from multiprocessing.managers import BaseManager
+
+from app.config import JOB_BATCH_WORKERS, JOB_MAX_RETAINED, JOB_SYNC_WAIT_SECONDS, JOB_TIMEOUT_SECONDS, JOB_WORKERS
+from app.metrics import current_route, merge_stage_timings, route_label, stage_sink
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+TIMED_OUT = "timed_out"
+FINISHED = (SUCCEEDED, FAILED, CANCELLED, TIMED_OUT)
+
+_handlers = {}
+_executors = {
+    "interactive": ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="job"),
+    "batch": ThreadPoolExecutor(max_workers=JOB_BATCH_WORKERS, thread_name_prefix="batch-job"),
+}
+_lock = threading.Lock()
+_jobs = OrderedDict()
+# Jobs still queued or running, keyed by (name, params) so identical submissions share one run
+_inflight = {}
+
+# Under gunicorn the jobs live in one dedicated process forked from the master (start_server),
+# so every web worker sees the same job table and de-duplication. Workers reach it through
+# _remote; in a single process (the dev server) _remote stays None and jobs run in-process.
+_remote = None
+_server_pid = None
+_server_address = None
+_server_authkey = None
+
+
+class JobPending(Exception):
+    # Raised by run when the job outlives the caller's wait; the job keeps running
+    def __init__(self, job):
+        super().__init__(f"{job.name} job {job.id} is still {job.status}")
+        self.job = job
+
+
+class JobBusy(RuntimeError):
+    # An identical job was cancelled or timed out but its handler has not returned yet
+    pass
+
+
+class Job:
+    def __init__(self, name, params, timeout, route=None):
+        self.id = uuid.uuid4().hex
+        self.name = name
+        self.params = params
+        # Stages run by the job are labelled with the route that submitted it and recorded
+        # here, so run() can add them to that request's Server-Timing
+        self.route = route or f"job:{name}"
+        self.stage_timings = {}
+        self.key = (name, tuple(sorted(params.items())))
+        self.timeout = timeout
+        self.status = QUEUED
+        self.submitted_on = datetime.now()
+        self.started_on = None
+        self.finished_on = None
+        self.deadline = None
+        self.result = None
+        self.error = None
+        self.future = None
+        self._cancel = threading.Event()
+        self._done = threading.Event()
+
+    def is_expired(self):
+        return self.deadline is not None and time.monotonic() > self.deadline
+
+    # Handed to job handlers so long loops can stop early on cancel or timeout
+    def should_stop(self):
+        return self._cancel.is_set() or self.is_expired()
+
+    def wait(self, timeout=None):
+        return self._done.wait(timeout)
+
+    def __getstate__(self):
+        # Snapshots sent to web workers leave the process-local events and future behind
+        state = self.__dict__.copy()
+        state.update(future=None, _cancel=None, _done=None)
+        return state
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "name": self.name,
+            "params": self.params,
+            "status": self.status,
+            "submitted_on": self.submitted_on.isoformat(),
+            "started_on": self.started_on.isoformat() if self.started_on else None,
+            "finished_on": self.finished_on.isoformat() if self.finished_on else None,
+            "timeout_seconds": self.timeout,
+            "error": self.error
+        }
+
+
+def register_job(name, handler, timeout=JOB_TIMEOUT_SECONDS, pool="interactive"):
+    _handlers[name] = (handler, timeout, _executors[pool])
+
+
+def _release(job):
+    if _inflight.get(job.key) is job:
+        del _inflight[job.key]
+
+
+def _evict_finished():
+    finished = [job_id for job_id, job in _jobs.items() if job.status in FINISHED]
+    for job_id in finished[:max(0, len(finished) - JOB_MAX_RETAINED)]:
+        del _jobs[job_id]
+
+
+def _finish(job, result, error):
+    with _lock:
+        if job._cancel.is_set():
+            job.status, job.result = CANCELLED, None
+        elif job.is_expired():
+            job.status, job.result = TIMED_OUT, None
+            job.error = error or f"Job exceeded its {job.timeout}s time limit"
+        elif error:
+            job.status, job.error = FAILED, error
+        else:
+            job.status, job.result = SUCCEEDED, result
+        job.finished_on = datetime.now()
+        _release(job)
+        _evict_finished()
+    job._done.set()
+
+
+def _run(job, handler):
+    with _lock:
+        if job._cancel.is_set():
+            job.status = CANCELLED
+            job.finished_on = datetime.now()
+            _release(job)
+            job._done.set()
+            return
+        job.status = RUNNING
+        job.started_on = datetime.now()
+        job.deadline = time.monotonic() + job.timeout
+
+    result, error = None, None
+    try:
+        with route_label(job.route), stage_sink(job.stage_timings):
+            result = handler(should_stop=job.should_stop, **job.params)
+    except Exception as e:
+        error = str(e)
+    _finish(job, result, error)
+
+
+def submit(name, **params):
+    return _submit(name, params, current_route())
+
+
+def _submit(name, params, route):
+    if _remote is not None:
+        return _remote.submit(name, params, route)
+    if name not in _handlers:
+        raise KeyError(f"Unknown job type: {name}")
+
+    handler, timeout, executor = _handlers[name]
+    params = {key: value for key, value in params.items() if value is not None}
+    # Reject unknown parameters up front instead of failing inside the worker
+    inspect.signature(handler).bind(should_stop=None, **params)
+    job = Job(name, params, timeout, route)
+
+    with _lock:
+        existing = _inflight.get(job.key)
+        if existing is not None:
+            # A cancelled or expired run still holds a worker until its handler sees should_stop,
+            # so starting a duplicate next to it would only stack up pool threads
+            if existing.should_stop():
+                raise JobBusy(f"An identical {name} job is still stopping; retry shortly")
+            return existing, True
+
+        _jobs[job.id] = job
+        _inflight[job.key] = job
+        job.future = executor.submit(_run, job, handler)
+    return job, False
+
+
+def get_job(job_id):
+    if _remote is not None:
+        return _remote.get_job(job_id)
+    with _lock:
+        return _jobs.get(job_id)
+
+
+def cancel(job_id):
+    if _remote is not None:
+        return _remote.cancel(job_id)
+    with _lock:
+        job = _jobs.get(job_id)
+        if job is None or job.status in FINISHED:
+            return job
+
+        job._cancel.set()
+        if job.future.cancel():
+            # Never started, so nothing else will mark it finished
+            job.status = CANCELLED
+            job.finished_on = datetime.now()
+            _release(job)
+            job._done.set()
+    return job
+
+
+def wait(job, timeout=None):
+    # Returns the job as it is once finished or after timeout; from a web worker that is a fresh snapshot
+    if _remote is not None:
+        return _remote.wait(job.id, timeout) or job
+    job.wait(timeout)
+    return job
+
+
+def run(name, job_id=None, wait_timeout=JOB_SYNC_WAIT_SECONDS, **params):
+    # Helper for synchronous routes: joins an identical in-flight job (or the given job_id when a
+    # client polls) and waits up to wait_timeout, raising JobPending if it is still running
+    if job_id:
+        job = get_job(job_id)
+        if job is None or job.name != name:
+            raise LookupError(f"Job not found: {job_id}")
+    else:
+        job, _ = submit(name, **params)
+
+    job = wait(job, wait_timeout)
+    if job.status not in FINISHED:
+        raise JobPending(job)
+    merge_stage_timings(job.stage_timings)
+    if job.status == TIMED_OUT:
+        raise TimeoutError(job.error)
+    if job.status != SUCCEEDED:
+        raise RuntimeError(job.error or f"{name} job {job.status}")
+    return job.result
+
+
+def shutdown(wait=True):
+    # Stop accepting work, drop queued jobs and ask running ones to stop. A web worker using the
+    # job process leaves it running; stop_server takes it down with the master.
+    if _remote is not None:
+        return
+    with _lock:
+        for job in _inflight.values():
+            job._cancel.set()
+    for executor in _executors.values():
+        executor.shutdown(wait=wait, cancel_futures=True)
+
+
+class JobService:
+    # Served by the job process; web workers call it through a JobManager proxy
+    def submit(self, name, params, route=None):
+        return _submit(name, params, route)
+
+    def get_job(self, job_id):
+        return get_job(job_id)
+
+    def cancel(self, job_id):
+        return cancel(job_id)
+
+    def wait(self, job_id, timeout=None):
+        job = get_job(job_id)
+        return wait(job, timeout) if job is not None else None
+
+
+class JobManager(BaseManager):
+    pass
+
+
+JobManager.register("JobService", JobService)
+
+
+def _serve(address, authkey):
+    from app.config import engine, replica_engine
+
+    # Forked from the gunicorn master: drop its signal handlers and its pooled connections
+    for sig in (signal.SIGINT, signal.SIGHUP, signal.SIGQUIT, signal.SIGUSR1, signal.SIGUSR2,
+                signal.SIGCHLD, signal.SIGWINCH, signal.SIGTTIN, signal.SIGTTOU):
+        signal.signal(sig, signal.SIG_DFL)
+
+    def stop(signum, frame):
+        raise SystemExit(0)
+
+    signal.signal(signal.SIGTERM, stop)
+    engine.dispose(close=False)
+    replica_engine.dispose(close=False)
+
+    server = JobManager(address=address, authkey=authkey).get_server()
+    server.serve_forever()
+
+
+def start_server(startup_timeout=30):
+    # Called in the gunicorn master after the app is preloaded, before workers are forked
+    global _server_pid, _server_address, _server_authkey
+    _server_address = os.path.join(tempfile.mkdtemp(prefix="jobs-"), "jobs.sock")
+    _server_authkey = os.urandom(32)
+
+    # A bare fork rather than multiprocessing.Process, so the workers forked later do not
+    # inherit it as a multiprocessing child and try to join it on exit
+    pid = os.fork()
+    if pid == 0:
+        code = 0
+        try:
+            _serve(_server_address, _server_authkey)
+        except SystemExit as e:
+            code = e.code or 0
+        except BaseException:
+            code = 1
+        finally:
+            # Running jobs see should_stop and wind down; skip the master's atexit handlers
+            shutdown(wait=True)
+            os._exit(code)
+
+    _server_pid = pid
+    deadline = time.monotonic() + startup_timeout
+    while not os.path.exists(_server_address):
+        if os.waitpid(pid, os.WNOHANG)[0] == pid or time.monotonic() > deadline:
+            raise RuntimeError("Job process failed to start")
+        time.sleep(0.05)
+    return pid
+
+
+def connect():
+    # Called in each web worker after fork
+    global _remote
+    manager = JobManager(address=_server_address, authkey=_server_authkey)
+    manager.connect()
+    _remote = manager.JobService()
+
+
+def _wait_exit(pid, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if os.waitpid(pid, os.WNOHANG)[0] == pid:
+                return True
+        except ChildProcessError:
+            # Already reaped (gunicorn's arbiter reaps every child it is told about)
+            return True
+        time.sleep(0.1)
+    return False
+
+
+def stop_server(timeout=30):
+    global _server_pid
+    if _server_pid is None:
+        return
+    try:
+        os.kill(_server_pid, signal.SIGTERM)
+        if not _wait_exit(_server_pid, timeout):
+            os.kill(_server_pid, signal.SIGKILL)
+            _wait_exit(_server_pid, 5)
+    except ProcessLookupError:
+        pass
+    _server_pid = None
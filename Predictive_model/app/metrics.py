@@ -0,0 +1,137 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import g, has_request_context, request
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest
+from prometheus_client import multiprocess
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+# Per-request profiling is opt-in with this header, e.g. `X-Profile: 1`
+PROFILE_HEADER = "X-Profile"
+
+# When set (gunicorn.conf.py does), every process writes its samples to files in this directory
+# and /metrics aggregates them, so a scrape sees the whole server rather than one worker.
+# prometheus_client reads it at import time, so it must be set before the app is loaded.
+MULTIPROCESS_DIR_ENV = "PROMETHEUS_MULTIPROC_DIR"
+
+_local = threading.local()
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "End-to-end request latency per route.", ("route", "method"),
+    buckets=DEFAULT_BUCKETS
+)
+REQUESTS_TOTAL = Counter(
+    "http_requests_total", "Requests served per route and status code.", ("route", "method", "status")
+)
+STAGE_LATENCY = Histogram(
+    "pipeline_stage_duration_seconds", "Time spent in each pipeline stage per route.", ("route", "stage"),
+    buckets=DEFAULT_BUCKETS
+)
+CACHE_REQUESTS = Counter(
+    "response_cache_requests_total", "Response cache lookups per route and result.", ("route", "result")
+)
+
+
+def is_multiprocess():
+    return bool(os.environ.get(MULTIPROCESS_DIR_ENV))
+
+
+def collect_registry():
+    if not is_multiprocess():
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+def current_route():
+    # Background work (jobs, warm-up) sets an explicit label; requests use their URL rule
+    route = getattr(_local, "route", None)
+    if route:
+        return route
+    if has_request_context() and request.url_rule is not None:
+        return request.url_rule.rule
+    return "background"
+
+
+@contextmanager
+def route_label(route):
+    previous = getattr(_local, "route", None)
+    _local.route = route
+    try:
+        yield
+    finally:
+        _local.route = previous
+
+
+@contextmanager
+def stage_sink(timings):
+    # Collects stage timings for work done outside the request, e.g. a job run for it
+    previous = getattr(_local, "stage_timings", None)
+    _local.stage_timings = timings
+    try:
+        yield
+    finally:
+        _local.stage_timings = previous
+
+
+def _add_timing(timings, name, elapsed):
+    timings[name] = timings.get(name, 0.0) + elapsed
+
+
+def merge_stage_timings(timings):
+    # Folds a job's stage timings into the current request's Server-Timing breakdown
+    if timings and has_request_context() and g.get("stage_timings") is not None:
+        for name, elapsed in timings.items():
+            _add_timing(g.stage_timings, name, elapsed)
+
+
+@contextmanager
+def stage(name):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_LATENCY.labels(current_route(), name).observe(elapsed)
+        sink = getattr(_local, "stage_timings", None)
+        if sink is not None:
+            _add_timing(sink, name, elapsed)
+        elif has_request_context() and g.get("stage_timings") is not None:
+            _add_timing(g.stage_timings, name, elapsed)
+
+
+def render_prometheus():
+    return generate_latest(collect_registry())
+
+
+def _server_timing(timings):
+    return ", ".join(f"{name};dur={elapsed * 1000:.2f}" for name, elapsed in timings.items())
+
+
+def init_app(app):
+    @app.before_request
+    def start_request_timer():
+        g.request_started = time.perf_counter()
+        profile = request.headers.get(PROFILE_HEADER, "").lower() in ("1", "true", "yes")
+        g.stage_timings = {} if profile else None
+
+    @app.after_request
+    def record_request(response):
+        started = g.get("request_started")
+        if started is None:
+            return response
+
+        elapsed = time.perf_counter() - started
+        route = current_route()
+        REQUEST_LATENCY.labels(route, request.method).observe(elapsed)
+        REQUESTS_TOTAL.labels(route, request.method, str(response.status_code)).inc()
+
+        timings = g.get("stage_timings")
+        if timings is not None:
+            timings["total"] = elapsed
+            response.headers["Server-Timing"] = _server_timing(timings)
+        return response
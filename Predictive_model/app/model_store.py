@@ -0,0 +1,61 @@
+import glob
+import os
+import pickle
+import threading
+
+import joblib
+
+VEHICLE_HEALTH_MODEL_PATH = "models/vehicle_health_iforest.pkl"
+PROPHET_MODEL_DIR = "prophet_models"
+
+_lock = threading.Lock()
+# path -> (mtime, model); loaded once per process, or once in the parent before forking
+_models = {}
+
+
+def _load_pickle(path):
+    with open(path, "rb") as f:
+        return pickle.load(f)
+
+
+def get_model(path, loader=joblib.load):
+    mtime = os.path.getmtime(path)
+    with _lock:
+        cached = _models.get(path)
+    if cached and cached[0] == mtime:
+        return cached[1]
+
+    model = loader(path)
+    with _lock:
+        _models[path] = (mtime, model)
+    return model
+
+
+def get_pickled_model(path):
+    return get_model(path, loader=_load_pickle)
+
+
+def put_model(path, model):
+    # Called after a model is retrained and written to disk
+    with _lock:
+        _models[path] = (os.path.getmtime(path), model)
+
+
+def preload_models():
+    loaded = []
+    if os.path.exists(VEHICLE_HEALTH_MODEL_PATH):
+        get_model(VEHICLE_HEALTH_MODEL_PATH)
+        loaded.append(VEHICLE_HEALTH_MODEL_PATH)
+
+    for path in sorted(glob.glob(os.path.join(PROPHET_MODEL_DIR, "prophet_model_*.pkl"))):
+        try:
+            get_pickled_model(path)
+            loaded.append(path)
+        except Exception as e:
+            print(f"Skipping model {path}: {e}")
+    return loaded
+
+
+def loaded_models():
+    with _lock:
+        return sorted(_models)
@@ -0,0 +1,85 @@
+# In-process copy of the small reference tables with dict indexes for O(1) lookups.
+# A snapshot is reused until the md5 watermark of the tables (the same check the response
+# cache uses, itself cached for RESPONSE_CACHE_WATERMARK_TTL seconds) changes.
+import threading
+
+from app.cache import get_watermark
+from app.db import read_sql
+
+REFERENCE_TABLES = ("vehicle", "spares_inventory_depot", "map_vehicle_type")
+
+VEHICLE_QUERY = """
+    SELECT vehicle_id, vehicle_number, vehicle_type_id, company_id
+    FROM vehicle
+    ORDER BY vehicle_id
+"""
+
+SPARE_QUERY = """
+    SELECT spare_id, spare_name, unit_price, quantity_available
+    FROM spares_inventory_depot
+    ORDER BY spare_id
+"""
+
+VEHICLE_TYPE_QUERY = """
+    SELECT vehicle_type_id, company_id, speed_limit
+    FROM map_vehicle_type
+"""
+
+
+class ReferenceData:
+    def __init__(self, vehicles, spares, vehicle_types, watermark=None):
+        self.vehicles = vehicles
+        self.spares = spares
+        self.vehicle_types = vehicle_types
+        self.watermark = watermark
+
+        self.vehicle_records = vehicles.to_dict(orient="records")
+        self.vehicle_by_id = {row["vehicle_id"]: row for row in self.vehicle_records}
+        self.vehicle_by_number = {row["vehicle_number"]: row for row in self.vehicle_records}
+        self.spare_by_id = {row["spare_id"]: row for row in spares.to_dict(orient="records")}
+        self.speed_limit_by_type = {
+            (row["vehicle_type_id"], row["company_id"]): row["speed_limit"]
+            for row in vehicle_types.to_dict(orient="records")
+        }
+
+        # vehicle joined to map_vehicle_type, the pair most joins in the services need
+        self.vehicle_speed_limits = vehicles.merge(vehicle_types, on=["vehicle_type_id", "company_id"])
+
+    def vehicle_numbers(self):
+        return sorted(row["vehicle_number"] for row in self.vehicle_records)
+
+
+_lock = threading.Lock()
+_snapshot = None
+
+
+def _load(watermark):
+    return ReferenceData(
+        read_sql(VEHICLE_QUERY, replica=True, name="reference_vehicle"),
+        read_sql(SPARE_QUERY, replica=True, name="reference_spares"),
+        read_sql(VEHICLE_TYPE_QUERY, replica=True, name="reference_vehicle_types"),
+        watermark
+    )
+
+
+def _current_watermark():
+    try:
+        return get_watermark(REFERENCE_TABLES)
+    except Exception:
+        # Without a change marker the snapshot cannot be trusted, so it is reloaded every time
+        return None
+
+
+def get_reference_data():
+    global _snapshot
+    watermark = _current_watermark()
+    snapshot = _snapshot
+    if snapshot is not None and watermark is not None and snapshot.watermark == watermark:
+        return snapshot
+
+    with _lock:
+        # Another thread may have reloaded while this one waited
+        if _snapshot is not None and watermark is not None and _snapshot.watermark == watermark:
+            return _snapshot
+        _snapshot = _load(watermark)
+        return _snapshot
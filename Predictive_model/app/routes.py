@@ -1,26 +1,89 @@
+import json
 import os
 import pickle
-from flask import Blueprint, jsonify, request
+from datetime import datetime
+from urllib.parse import urlencode
+from flask import Blueprint, Response, jsonify, request, stream_with_context
 import pandas as pd
-from sqlalchemy import text
 from sqlalchemy.exc import SQLAlchemyError
-from sqlalchemy.orm import scoped_session, Session
-from app.config import SessionLocal
-from services.predictive_maintenance.failure_analysis import cluster_failure_reasons, get_association_rules, load_failure_data
+from app import jobs, tracking_mirror, warmup
+from app.cache import cached_response
+from app.config import FAILURE_BATCH_TIMEOUT_SECONDS
+from app.db import fetch_scalar, get_query_stats
+from app.metrics import CONTENT_TYPE_LATEST, render_prometheus, stage
+from app.reference_data import get_reference_data
+from app.warmup import load_module
 from services.driver_behavior import get_driver_risk_profile_by_id
 from services.fleet_utilization import get_tracking_heatmap_data
-from services.predictive_maintenance.forecast_next_replacement import forecast_all_next_replacements
-from services.vehicle_health_monitor.vehicle_health import get_vehicle_health_json
+
+# Services that pull in prophet, sklearn or mlxtend are loaded on first use (or by the
+# warm-up thread) through load_module, so the app can start serving immediately.
+FAILURE_ANALYSIS = "services.predictive_maintenance.failure_analysis"
+FAILURE_ANALYSIS_BATCH = "services.predictive_maintenance.failure_analysis_batch"
+FORECAST = "services.predictive_maintenance.forecast_next_replacement"
+VEHICLE_HEALTH = "services.vehicle_health_monitor.vehicle_health"
 
 
 routes = Blueprint("routes", __name__)
-db_session = scoped_session(SessionLocal)
+
+
+def tracking_sources(*tables):
+    # While the mirror serves tracking_data, its cache_marker stands in for the table's watermark,
+    # so rows arriving in Postgres do not invalidate answers built from the last sync
+    def sources():
+        return tables if tracking_mirror.is_available() else ("tracking_data",) + tables
+    return sources
+
+
+def forecast_records(should_stop=None):
+    forecast_df = load_module(FORECAST).forecast_all_next_replacements(should_stop=should_stop)
+
+    with stage("serialize"):
+        # Convert Timestamp to ISO string and replace NaN/NaT with None
+        forecast_df['next_expected_replacement'] = forecast_df['next_expected_replacement'].apply(
+            lambda x: x.isoformat() if pd.notnull(x) else None
+        )
+
+        # Convert any remaining NaNs to None
+        forecast_df = forecast_df.where(pd.notnull(forecast_df), None)
+
+        return forecast_df.to_dict(orient='records')
+
+
+def failure_analysis_job(vehicle_number, should_stop=None):
+    return load_module(FAILURE_ANALYSIS).get_vehicle_failure_analysis(vehicle_number, should_stop=should_stop)
+
+
+def failure_analysis_batch_job(workers=None, should_stop=None):
+    batch = load_module(FAILURE_ANALYSIS_BATCH)
+    return batch.run_fleet_failure_analysis(max_workers=int(workers) if workers else None, should_stop=should_stop)
+
+
+jobs.register_job("predictive_maintenance", forecast_records)
+jobs.register_job("failure_analysis", failure_analysis_job)
+jobs.register_job("failure_analysis_batch", failure_analysis_batch_job,
+                  timeout=FAILURE_BATCH_TIMEOUT_SECONDS, pool="batch")
+
+
+def job_busy(error):
+    response = jsonify({"error": str(error)})
+    response.headers["Retry-After"] = "5"
+    return response, 503
+
+
+def job_accepted(job):
+    # The job outlived the request's wait: the client polls this same URL with the job id
+    params = {**request.args.to_dict(), "job_id": job.id}
+    response = jsonify(job.to_dict())
+    response.headers["Location"] = f"{request.path}?{urlencode(params)}"
+    return response, 202
+
 
 @routes.route('/driver_behavior', methods=['GET'])
+@cached_response(tracking_sources("vehicle", "map_vehicle_type", "trip_details", "driver_details", "alerts"),
+                 extra=tracking_mirror.cache_marker)
 def get_driver_risk():
     try:
-        db = db_session()
-
         # Read driver_id from query parameter
         driver_id = request.args.get("driver_id", default=None, type=int)
 
@@ -28,12 +91,13 @@ def get_driver_risk():
             return jsonify({"error": "Please provide driver_id as a query parameter."}), 400
 
         # Call risk profile function
-        risk_data = get_driver_risk_profile_by_id(db, driver_id=driver_id)
+        risk_data = get_driver_risk_profile_by_id(driver_id=driver_id)
 
         if not risk_data or "error" in risk_data:
             return jsonify(risk_data), 404
 
-        return jsonify(risk_data)
+        with stage("serialize"):
+            return jsonify(risk_data)
 
     except SQLAlchemyError as e:
         return jsonify({"error": f"Database error: {str(e)}"}), 500
@@ -43,32 +107,38 @@ def get_driver_risk():
 
 
 @routes.route('/predictive_maintenance', methods=['GET'])
+# Prophet models are retrained monthly, so the month is part of the cache key. Routes that can
+# read the tracking mirror also key on its sync watermark.
+@cached_response(tracking_sources("spare_replacement", "spares_inventory_depot", "vehicle"),
+                 extra=lambda: (datetime.now().strftime("%Y-%m"), tracking_mirror.cache_marker()))
 def get_next_replacement():
     try:
         vehicle_reg_no = request.args.get('vehicle_reg_no')
         spare_name = request.args.get('spare_name')
 
-        forecast_df = forecast_all_next_replacements()
+        # Concurrent callers share a single in-flight forecast run
+        forecast_list = jobs.run("predictive_maintenance", job_id=request.args.get('job_id'))
 
         if vehicle_reg_no:
-            forecast_df = forecast_df[forecast_df['vehicle_reg_no'] == vehicle_reg_no]
+            forecast_list = [row for row in forecast_list if row['vehicle_reg_no'] == vehicle_reg_no]
         if spare_name:
-            forecast_df = forecast_df[forecast_df['spare_name'].str.lower() == spare_name.lower()]
+            forecast_list = [row for row in forecast_list
+                             if row['spare_name'] and row['spare_name'].lower() == spare_name.lower()]
 
-        if forecast_df.empty:
+        if not forecast_list:
             return jsonify({"message": "No data found for the given parameters."}), 404
 
-        # Convert Timestamp to ISO string and replace NaN/NaT with None
-        forecast_df['next_expected_replacement'] = forecast_df['next_expected_replacement'].apply(
-            lambda x: x.isoformat() if pd.notnull(x) else None
-        )
-
-        # Convert any remaining NaNs to None
-        forecast_df = forecast_df.where(pd.notnull(forecast_df), None)
-
-        forecast_list = forecast_df.to_dict(orient='records')
-        return jsonify(forecast_list), 200
-
+        with stage("serialize"):
+            return jsonify(forecast_list), 200
+
+    except jobs.JobPending as e:
+        return job_accepted(e.job)
+    except jobs.JobBusy as e:
+        return job_busy(e)
+    except LookupError as e:
+        return jsonify({"message": e.args[0]}), 404
+    except TimeoutError as e:
+        return jsonify({"error": str(e)}), 504
     except SQLAlchemyError as e:
         return jsonify({"error": "Database error: " + str(e)}), 500
     except Exception as e:
@@ -77,6 +147,7 @@ def get_next_replacement():
 
 
 @routes.route('/generate-fleet-heatmap', methods=['GET'])
+@cached_response(tracking_sources(), extra=tracking_mirror.cache_marker)
 def tracking_heatmap():
     vehicle_id = request.args.get('vehicle_id')
     start_date = request.args.get('start_date')
@@ -86,7 +157,8 @@ def tracking_heatmap():
         heatmap_data = get_tracking_heatmap_data(vehicle_id, start_date, end_date)
         if not heatmap_data:
             return jsonify({"message": "No heatmap data found"}), 404
-        return jsonify({"heatmap_data": heatmap_data}), 200
+        with stage("serialize"):
+            return jsonify({"heatmap_data": heatmap_data}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -94,13 +166,9 @@ def tracking_heatmap():
 @routes.route('/get-vehicle-list', methods=['GET'])
 def get_vehicle_list():
     try:
-        db = db_session()
-        query = text("SELECT vehicle_id, vehicle_number FROM vehicle ORDER BY vehicle_id")
-        result = db.execute(query).mappings().all()
-
         vehicle_list = [
             {"vehicle_id": row["vehicle_id"], "vehicle_number": row["vehicle_number"]}
-            for row in result
+            for row in get_reference_data().vehicle_records
         ]
         return jsonify({"vehicles": vehicle_list}), 200
     except Exception as e:
@@ -108,19 +176,54 @@ def get_vehicle_list():
     
     
 @routes.route('/vehicle-health-status', methods=['GET'])
+@cached_response(tracking_sources(), extra=tracking_mirror.cache_marker)
 def get_vehicle_health_status():
     try:
         vehicle_reg_no = request.args.get('vehicle_reg_no', default=None, type=str)
-        results = get_vehicle_health_json(vehicle_reg_no=vehicle_reg_no)
+        results = load_module(VEHICLE_HEALTH).get_vehicle_health_json(vehicle_reg_no=vehicle_reg_no)
 
         if not results:
             return jsonify({"message": "No vehicle health data found"}), 404
 
-        return jsonify(results), 200
+        with stage("serialize"):
+            return jsonify(results), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@routes.route('/vehicle-health-status/stream', methods=['GET'])
+def stream_vehicle_health_status():
+    # NDJSON, one scored vehicle-day per line, written batch by batch
+    vehicle_reg_no = request.args.get('vehicle_reg_no', default=None, type=str)
+    vehicle_reg_nos = [v.strip() for v in vehicle_reg_no.split(',') if v.strip()] if vehicle_reg_no else None
+    batch_size = request.args.get('batch_size', default=50, type=int)
+    try:
+        start = pd.Timestamp(request.args['start_date']) if request.args.get('start_date') else None
+        end = pd.Timestamp(request.args['end_date']) if request.args.get('end_date') else None
+    except ValueError:
+        return jsonify({"error": "Invalid date format. Use YYYY-MM-DD or ISO timestamps."}), 400
+    if end is not None and len(request.args['end_date']) == 10:
+        # A bare end date covers that whole day
+        end = end + pd.Timedelta(days=1) - pd.Timedelta(microseconds=1)
+    if batch_size < 1:
+        return jsonify({"error": "batch_size must be at least 1"}), 400
+
+    vehicle_health = load_module(VEHICLE_HEALTH)
+
+    def generate():
+        try:
+            for records in vehicle_health.iter_vehicle_health_batches(
+                vehicle_reg_nos=vehicle_reg_nos, start=start, end=end, batch_size=batch_size
+            ):
+                with stage("serialize"):
+                    yield "".join(json.dumps(record) + "\n" for record in records)
+        except Exception as e:
+            # Headers are already sent, so the error goes out as the last line
+            yield json.dumps({"error": str(e)}) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
 @routes.route('/failure-analysis', methods=['GET'])
+@cached_response("spare_replacement", "vehicle")
 def failure_analysis():
     try:
         # Get vehicle_number from query parameters
@@ -129,37 +232,133 @@ def failure_analysis():
         if not vehicle_number:
             return jsonify({"error": "Please provide vehicle_number as a query parameter."}), 400
 
-        # Start a session using the scoped session
-        with db_session() as session:  # Using db_session here
-            # Load the failure data using the session
-            df_failure_data, replacement_dict = load_failure_data(session)
+        # Identical concurrent requests share one clustering and association rule run
+        analysis = jobs.run("failure_analysis", job_id=request.args.get('job_id'), vehicle_number=vehicle_number)
+
+        if analysis is None:
+            return jsonify({"message": f"No failure records found for vehicle: {vehicle_number}"}), 404
+
+        with stage("serialize"):
+            return jsonify(analysis), 200
+
+    except jobs.JobPending as e:
+        return job_accepted(e.job)
+    except jobs.JobBusy as e:
+        return job_busy(e)
+    except LookupError as e:
+        return jsonify({"message": e.args[0]}), 404
+    except TimeoutError as e:
+        return jsonify({"error": str(e)}), 504
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@routes.route('/failure-analysis/batch', methods=['POST'])
+def failure_analysis_batch():
+    # A fleet run takes far longer than a request, so it goes to the job runner; the summary
+    # (with the run_id for /failure-analysis/batch/<run_id>) is served from /jobs/<id>/result
+    try:
+        workers = request.args.get('workers', default=None, type=int)
+        job, deduplicated = jobs.submit("failure_analysis_batch", workers=workers)
+
+        response = jsonify({**job.to_dict(), "deduplicated": deduplicated})
+        response.headers["Location"] = f"/jobs/{job.id}"
+        return response, 202
+    except jobs.JobBusy as e:
+        return job_busy(e)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
 
-            # Filter data for the specified vehicle_number
-            filtered_df = df_failure_data[df_failure_data["vehicle_number"] == vehicle_number]
+@routes.route('/failure-analysis/batch/<run_id>', methods=['GET'])
+def failure_analysis_batch_results(run_id):
+    try:
+        results = load_module(FAILURE_ANALYSIS_BATCH).fetch_batch_results(run_id)
+        if not results:
+            return jsonify({"message": f"No batch results found for run: {run_id}"}), 404
+        return jsonify(results), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
 
-            if filtered_df.empty:
-                return jsonify({"message": f"No failure records found for vehicle: {vehicle_number}"}), 404
 
-            if len(filtered_df) < 2:
-                return jsonify({
-                    "cluster_data": [],
-                    "predictions": [],
-                    "silhouette_score": 0,
-                    "message": "Not enough data to perform clustering or rules"
-                }), 200
+@routes.route('/db-stats', methods=['GET'])
+def db_stats():
+    return jsonify(get_query_stats()), 200
 
-            # Perform clustering and association rule generation
-            cluster_data, silhouette_avg, filtered_df_with_clusters = cluster_failure_reasons(filtered_df)
-            predictions = get_association_rules(filtered_df_with_clusters, replacement_dict, clusters=True)
 
-            if not predictions and cluster_data:
-                predictions = [{"cluster": 0, "rules": [cluster_data[0]["highlight"]]}]
+@routes.route('/metrics', methods=['GET'])
+def metrics():
+    return Response(render_prometheus(), content_type=CONTENT_TYPE_LATEST)
 
-            return jsonify({
-                "cluster_data": cluster_data,
-                "predictions": predictions,
-                "silhouette_score": silhouette_avg
-            }), 200
 
+@routes.route('/jobs/<name>', methods=['POST'])
+def submit_job(name):
+    try:
+        params = request.get_json(silent=True) or {}
+        params.update(request.args.to_dict())
+        job, deduplicated = jobs.submit(name, **params)
+
+        response = jsonify({**job.to_dict(), "deduplicated": deduplicated})
+        response.headers["Location"] = f"/jobs/{job.id}"
+        return response, 202
+    except KeyError as e:
+        return jsonify({"error": e.args[0]}), 404
+    except jobs.JobBusy as e:
+        return job_busy(e)
+    except TypeError as e:
+        return jsonify({"error": f"Invalid job parameters: {str(e)}"}), 400
+
+
+@routes.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    job = jobs.get_job(job_id)
+    if job is None:
+        return jsonify({"message": f"Job not found: {job_id}"}), 404
+    return jsonify(job.to_dict()), 200
+
+
+@routes.route('/jobs/<job_id>/result', methods=['GET'])
+def job_result(job_id):
+    job = jobs.get_job(job_id)
+    if job is None:
+        return jsonify({"message": f"Job not found: {job_id}"}), 404
+
+    if job.status in (jobs.QUEUED, jobs.RUNNING):
+        return jsonify(job.to_dict()), 202
+    if job.status == jobs.CANCELLED:
+        return jsonify(job.to_dict()), 410
+    if job.status == jobs.TIMED_OUT:
+        return jsonify(job.to_dict()), 504
+    if job.status == jobs.FAILED:
+        return jsonify({"error": job.error}), 500
+    if job.result is None:
+        return jsonify({"message": "Job finished without data"}), 404
+
+    with stage("serialize"):
+        return jsonify(job.result), 200
+
+
+@routes.route('/jobs/<job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    job = jobs.cancel(job_id)
+    if job is None:
+        return jsonify({"message": f"Job not found: {job_id}"}), 404
+    return jsonify(job.to_dict()), 200
+
+
+@routes.route('/health', methods=['GET'])
+def health():
+    state = warmup.get_state()
+    try:
+        fetch_scalar("SELECT 1", name="health_check")
+        database = "ok"
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
\ No newline at end of file
+        database = f"error: {str(e)}"
+
+    # Not ready while the warm-up thread is still importing models and libraries
+    ready = database == "ok" and state["status"] != "running"
+    return jsonify({
+        "status": "ready" if ready else "unavailable",
+        "database": database,
+        "warmup": state
+    }), 200 if ready else 503
@@ -0,0 +1,358 @@
+# Local columnar mirror of tracking_data, stored as Parquet files partitioned by day:
+#   <TRACKING_MIRROR_DIR>/date=YYYY-MM-DD/part-<first_id>-<last_id>.parquet
+# Kept current by an incremental sync on the id watermark:
+#   python -m app.tracking_mirror --sync [--loop 300] [--compact]
+# Ids below the watermark that were still missing (rows from transactions that commit out of id
+# order) are remembered for TRACKING_MIRROR_ID_LOOKBACK ids and picked up by later syncs.
+# Compaction never moves or deletes a file a running scan may have listed: the merged file is added
+# next to the parts it replaces, _watermark.json records the replacement so readers skip those
+# parts, and they are deleted TRACKING_MIRROR_RETIRE_SECONDS later.
+import argparse
+import fcntl
+import glob
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import bindparam, text
+from app.config import (
+    TRACKING_MIRROR_BATCH_SIZE, TRACKING_MIRROR_DIR, TRACKING_MIRROR_ENABLED, TRACKING_MIRROR_ID_LOOKBACK,
+    TRACKING_MIRROR_RETIRE_SECONDS
+)
+from app.db import read_sql
+from app.metrics import stage
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.fs as pafs
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+COLUMNS = [
+    "id", "vehicle_reg_no", "vehicle_timestamp", "created_on", "speed", "heading", "ignition_status",
+    "latitude", "longitude", "main_input_voltage", "internal_battery_voltage", "main_power_status",
+    "gps_fix", "tamper_alert", "emergency_status",
+]
+
+# Every file is written with this schema. Types inferred per batch are not enough: a day with
+# no tamper alerts would type tamper_alert as null and no later file could be cast to it.
+SCHEMA = pa.schema([
+    ("id", pa.int64()),
+    ("vehicle_reg_no", pa.string()),
+    ("vehicle_timestamp", pa.timestamp("ns")),
+    ("created_on", pa.timestamp("ns")),
+    ("speed", pa.float64()),
+    ("heading", pa.float64()),
+    ("ignition_status", pa.string()),
+    ("latitude", pa.string()),
+    ("longitude", pa.string()),
+    ("main_input_voltage", pa.float64()),
+    ("internal_battery_voltage", pa.float64()),
+    ("main_power_status", pa.string()),
+    ("gps_fix", pa.string()),
+    ("tamper_alert", pa.string()),
+    ("emergency_status", pa.float64()),
+]) if pa is not None else None
+
+WATERMARK_FILE = "_watermark.json"
+LOCK_FILE = "_sync.lock"
+
+_sync_lock = threading.Lock()
+
+
+@contextmanager
+def _writer_lock(mirror_dir):
+    # sync and compact usually run from CLI processes of their own, so a thread lock is not enough
+    os.makedirs(mirror_dir, exist_ok=True)
+    with _sync_lock, open(os.path.join(mirror_dir, LOCK_FILE), "w") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _watermark_path(mirror_dir):
+    return os.path.join(mirror_dir, WATERMARK_FILE)
+
+
+def read_watermark(mirror_dir=TRACKING_MIRROR_DIR):
+    path = _watermark_path(mirror_dir)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def _write_watermark(mirror_dir, watermark):
+    # Write then rename so readers never see a half-written file
+    path = _watermark_path(mirror_dir)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(watermark, f)
+    os.replace(tmp_path, path)
+
+
+def is_available(mirror_dir=TRACKING_MIRROR_DIR):
+    return TRACKING_MIRROR_ENABLED and pa is not None and read_watermark(mirror_dir) is not None
+
+
+def cache_marker(mirror_dir=TRACKING_MIRROR_DIR):
+    # Response cache key part for routes that read the mirror: their data changes when the
+    # mirror syncs, not when tracking_data gets a row
+    if not TRACKING_MIRROR_ENABLED or pa is None:
+        return None
+    watermark = read_watermark(mirror_dir)
+    return (watermark["last_id"], watermark["row_count"], watermark.get("generation", 0)) if watermark else None
+
+
+def partition_dates(mirror_dir=TRACKING_MIRROR_DIR):
+    return sorted(
+        os.path.basename(path)[len("date="):]
+        for path in glob.glob(os.path.join(mirror_dir, "date=*")) if os.path.isdir(path)
+    )
+
+
+def _live_parts(mirror_dir, watermark=None):
+    # List the files before reading the watermark: compaction records what a merged file replaces
+    # before it renames it into place, so every merged file listed here is already known
+    present = {
+        os.path.relpath(path, mirror_dir)
+        for path in glob.glob(os.path.join(mirror_dir, "date=*", "part-*.parquet"))
+    }
+    if watermark is None:
+        watermark = read_watermark(mirror_dir) or {}
+
+    replaced = set()
+    for name, entry in watermark.get("compactions", {}).items():
+        if name in present:
+            replaced.update(entry["replaced"])
+    return sorted(os.path.join(mirror_dir, name) for name in present - replaced)
+
+
+def _to_table(df):
+    return pa.Table.from_pandas(df[COLUMNS], preserve_index=False).cast(SCHEMA)
+
+
+def _write_partitions(mirror_dir, df):
+    for day, day_df in df.groupby("date"):
+        partition_dir = os.path.join(mirror_dir, f"date={day}")
+        os.makedirs(partition_dir, exist_ok=True)
+
+        # Sorting by vehicle keeps row-group statistics tight, so vehicle filters can skip row groups
+        day_df = day_df.drop(columns=["date"]).sort_values(["vehicle_reg_no", "vehicle_timestamp"])
+        file_name = f"part-{int(day_df['id'].min())}-{int(day_df['id'].max())}.parquet"
+        tmp_path = os.path.join(partition_dir, "." + file_name)
+        pq.write_table(_to_table(day_df), tmp_path)
+        os.replace(tmp_path, os.path.join(partition_dir, file_name))
+
+
+def _store_batch(mirror_dir, df, watermark):
+    # Rows without a timestamp cannot be placed in a day partition
+    df = df[df["vehicle_timestamp"].notna()]
+    if not df.empty:
+        df["date"] = df["vehicle_timestamp"].dt.strftime("%Y-%m-%d")
+        _write_partitions(mirror_dir, df)
+
+        max_ts = df["vehicle_timestamp"].max()
+        if watermark["max_vehicle_timestamp"] is None or max_ts > pd.Timestamp(watermark["max_vehicle_timestamp"]):
+            watermark["max_vehicle_timestamp"] = max_ts.isoformat()
+    watermark["row_count"] += len(df)
+    return len(df)
+
+
+def _sync_pending(mirror_dir, watermark, lookback):
+    # Re-read the ids that were missing when the watermark moved past them
+    pending = [rid for rid in watermark.get("pending_ids", []) if rid > watermark["last_id"] - lookback]
+    if not pending:
+        watermark["pending_ids"] = []
+        return 0
+
+    query = text(f"SELECT {', '.join(COLUMNS)} FROM tracking_data WHERE id IN :ids").bindparams(
+        bindparam("ids", expanding=True)
+    )
+    df = read_sql(query, params={"ids": pending}, replica=True, name="tracking_mirror_sync_pending",
+                  parse_dates=["vehicle_timestamp", "created_on"])
+    found = set(int(rid) for rid in df["id"])
+    watermark["pending_ids"] = [rid for rid in pending if rid not in found]
+    return _store_batch(mirror_dir, df, watermark) if not df.empty else 0
+
+
+def sync(mirror_dir=TRACKING_MIRROR_DIR, batch_size=TRACKING_MIRROR_BATCH_SIZE, lookback=TRACKING_MIRROR_ID_LOOKBACK):
+    if pa is None:
+        raise RuntimeError("pyarrow is required for the tracking mirror")
+
+    with _writer_lock(mirror_dir):
+        watermark = read_watermark(mirror_dir) or {"last_id": 0, "max_vehicle_timestamp": None, "row_count": 0}
+        synced_rows = _sync_pending(mirror_dir, watermark, lookback)
+
+        query = f"""
+            SELECT {", ".join(COLUMNS)}
+            FROM tracking_data
+            WHERE id > :last_id
+            ORDER BY id
+            LIMIT :batch_size
+        """
+        while True:
+            df = read_sql(query, params={"last_id": watermark["last_id"], "batch_size": batch_size},
+                          replica=True, name="tracking_mirror_sync",
+                          parse_dates=["vehicle_timestamp", "created_on"])
+            if df.empty:
+                break
+
+            batch_rows = len(df)
+            previous_id = watermark["last_id"]
+            last_id = int(df["id"].max())
+            # Ids skipped inside the lookback window may still be committed later
+            window = np.arange(max(previous_id, last_id - lookback) + 1, last_id + 1)
+            gaps = np.setdiff1d(window, df["id"].to_numpy(), assume_unique=True)
+            watermark["pending_ids"] = [
+                rid for rid in watermark.get("pending_ids", []) if rid > last_id - lookback
+            ] + [int(rid) for rid in gaps]
+
+            synced_rows += _store_batch(mirror_dir, df, watermark)
+            watermark["last_id"] = last_id
+            watermark["synced_on"] = datetime.now().isoformat()
+            _write_watermark(mirror_dir, watermark)
+
+            if batch_rows < batch_size:
+                break
+
+        watermark["synced_on"] = datetime.now().isoformat()
+        _write_watermark(mirror_dir, watermark)
+        return {"synced_rows": synced_rows,
+                **{k: v for k, v in watermark.items() if k not in ("pending_ids", "compactions")},
+                "pending_ids": len(watermark["pending_ids"])}
+
+
+def _remove_retired(mirror_dir, watermark, retire_seconds):
+    compactions = watermark.get("compactions", {})
+    cutoff = datetime.now() - timedelta(seconds=retire_seconds)
+    expired = [name for name, entry in compactions.items() if datetime.fromisoformat(entry["compacted_on"]) <= cutoff]
+    if not expired:
+        return
+
+    # The files go before their entries, so a reader never sees a replaced part it should use
+    for name in expired:
+        for part in compactions[name]["replaced"]:
+            try:
+                os.remove(os.path.join(mirror_dir, part))
+            except FileNotFoundError:
+                pass
+    for name in expired:
+        del compactions[name]
+    _write_watermark(mirror_dir, watermark)
+
+
+def compact(mirror_dir=TRACKING_MIRROR_DIR, min_files=4, retire_seconds=TRACKING_MIRROR_RETIRE_SECONDS):
+    # Incremental syncs leave many small files per day; merge them into one
+    compacted = []
+    with _writer_lock(mirror_dir):
+        watermark = read_watermark(mirror_dir)
+        if watermark is None:
+            return compacted
+        _remove_retired(mirror_dir, watermark, retire_seconds)
+
+        parts_by_day = {}
+        for path in _live_parts(mirror_dir, watermark):
+            parts_by_day.setdefault(os.path.dirname(path), []).append(path)
+
+        for day in partition_dates(mirror_dir):
+            partition_dir = os.path.join(mirror_dir, f"date={day}")
+            parts = parts_by_day.get(partition_dir, [])
+            if len(parts) < min_files:
+                continue
+
+            table = pq.read_table(parts, schema=SCHEMA)
+            df = table.to_pandas().sort_values(["vehicle_reg_no", "vehicle_timestamp"])
+            watermark["generation"] = watermark.get("generation", 0) + 1
+            file_name = f"part-{int(df['id'].min())}-{int(df['id'].max())}-c{watermark['generation']}.parquet"
+            tmp_path = os.path.join(partition_dir, "." + file_name)
+            pq.write_table(_to_table(df), tmp_path)
+
+            name = os.path.relpath(os.path.join(partition_dir, file_name), mirror_dir)
+            watermark.setdefault("compactions", {})[name] = {
+                "replaced": [os.path.relpath(part, mirror_dir) for part in parts],
+                "compacted_on": datetime.now().isoformat()
+            }
+            _write_watermark(mirror_dir, watermark)
+            os.replace(tmp_path, os.path.join(partition_dir, file_name))
+            compacted.append(day)
+    return compacted
+
+
+def _dataset(mirror_dir):
+    # use_mmap lets Arrow map the Parquet files instead of reading them into private buffers
+    # The explicit schema also reads files written before it existed, casting their null columns
+    # Built from the live file list, so parts already merged by compaction are never read twice
+    return ds.dataset(
+        _live_parts(mirror_dir),
+        schema=SCHEMA.append(pa.field("date", pa.string())),
+        format="parquet",
+        filesystem=pafs.LocalFileSystem(use_mmap=True),
+        partitioning=ds.partitioning(pa.schema([("date", pa.string())]), flavor="hive"),
+        partition_base_dir=mirror_dir
+    )
+
+
+def _date_string(value):
+    return pd.Timestamp(value).strftime("%Y-%m-%d")
+
+
+def read_tracking(columns=None, vehicle_reg_no=None, start=None, end=None, start_date=None, end_date=None,
+                  mirror_dir=TRACKING_MIRROR_DIR):
+    # start/end bound vehicle_timestamp (inclusive), start_date/end_date bound the day partition;
+    # both prune whole days before any file is opened
+    dataset = _dataset(mirror_dir)
+    timestamp_type = dataset.schema.field("vehicle_timestamp").type
+
+    conditions = []
+    if vehicle_reg_no is not None:
+        values = vehicle_reg_no if isinstance(vehicle_reg_no, (list, tuple, set)) else [vehicle_reg_no]
+        conditions.append(ds.field("vehicle_reg_no").isin(list(values)))
+    if start is not None:
+        conditions.append(ds.field("date") >= _date_string(start))
+        conditions.append(ds.field("vehicle_timestamp") >= pa.scalar(pd.Timestamp(start), type=timestamp_type))
+    if end is not None:
+        conditions.append(ds.field("date") <= _date_string(end))
+        conditions.append(ds.field("vehicle_timestamp") <= pa.scalar(pd.Timestamp(end), type=timestamp_type))
+    if start_date is not None:
+        conditions.append(ds.field("date") >= _date_string(start_date))
+    if end_date is not None:
+        conditions.append(ds.field("date") <= _date_string(end_date))
+
+    expression = None
+    for condition in conditions:
+        expression = condition if expression is None else expression & condition
+
+    with stage("mirror_scan"):
+        table = dataset.to_table(columns=columns or COLUMNS, filter=expression)
+        return table.to_pandas(split_blocks=True, self_destruct=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain the local tracking_data mirror")
+    parser.add_argument("--sync", action="store_true", help="Pull rows newer than the id watermark")
+    parser.add_argument("--compact", action="store_true", help="Merge small files within each day")
+    parser.add_argument("--loop", type=int, default=0, help="Repeat every N seconds")
+    parser.add_argument("--dir", default=TRACKING_MIRROR_DIR, help="Mirror directory")
+    args = parser.parse_args()
+
+    while True:
+        if args.sync:
+            started = time.perf_counter()
+            result = sync(args.dir)
+            print(f"Synced {result['synced_rows']} rows up to id {result['last_id']} "
+                  f"in {time.perf_counter() - started:.1f}s")
+        if args.compact:
+            print(f"Compacted partitions: {compact(args.dir)}")
+        if not args.loop:
+            break
+        time.sleep(args.loop)
@@ -0,0 +1,99 @@
+import importlib
+import sys
+import threading
+import time
+
+from app.metrics import stage
+from app.model_store import preload_models
+from app.reference_data import get_reference_data
+
+# Third-party libraries that dominate startup time
+HEAVY_MODULES = [
+    "pandas",
+    "numpy",
+    "sklearn.ensemble",
+    "sklearn.cluster",
+    "mlxtend.frequent_patterns",
+    "prophet",
+]
+
+# Analytics services the routes load on first use
+SERVICE_MODULES = [
+    "services.predictive_maintenance.failure_analysis",
+    "services.predictive_maintenance.failure_analysis_batch",
+    "services.predictive_maintenance.forecast_next_replacement",
+    "services.vehicle_health_monitor.vehicle_health",
+]
+
+_warmup_hooks = []
+_state_lock = threading.Lock()
+_state = {"status": "not_started", "started_on": None, "finished_on": None, "timings": {}}
+# module name -> first import cost in ms
+_import_timings = {}
+
+
+def _is_loaded(name):
+    # A module is put in sys.modules before its body runs, so presence alone is not enough
+    module = sys.modules.get(name)
+    spec = getattr(module, "__spec__", None)
+    return module is not None and not getattr(spec, "_initializing", False)
+
+
+def load_module(name):
+    # Always go through import_module: it waits on the per-module import lock while another
+    # thread (e.g. the warm-up) is still importing, instead of returning a half-built module
+    if _is_loaded(name):
+        return importlib.import_module(name)
+
+    started = time.perf_counter()
+    with stage("module_load"):
+        module = importlib.import_module(name)
+    with _state_lock:
+        _import_timings.setdefault(name, round((time.perf_counter() - started) * 1000, 2))
+    return module
+
+
+def register_warmup(name, hook):
+    _warmup_hooks.append((name, hook))
+
+
+def import_heavy_modules():
+    for name in HEAVY_MODULES + SERVICE_MODULES:
+        load_module(name)
+
+
+def run_warmup():
+    with _state_lock:
+        _state["status"] = "running"
+        _state["started_on"] = time.time()
+
+    timings = {}
+    for name, hook in _warmup_hooks:
+        started = time.perf_counter()
+        try:
+            hook()
+        except Exception as e:
+            print(f"Warm-up step {name} failed: {e}")
+        timings[name] = round((time.perf_counter() - started) * 1000, 2)
+
+    with _state_lock:
+        _state["status"] = "done"
+        _state["finished_on"] = time.time()
+        _state["timings"] = timings
+    return timings
+
+
+def start_background_warmup():
+    thread = threading.Thread(target=run_warmup, name="warmup", daemon=True)
+    thread.start()
+    return thread
+
+
+def get_state():
+    with _state_lock:
+        return {**_state, "import_timings_ms": dict(_import_timings)}
+
+
+register_warmup("import_heavy_modules", import_heavy_modules)
+register_warmup("preload_models", preload_models)
+register_warmup("reference_data", get_reference_data)
@@ -0,0 +1,69 @@
+# Compares two load_test reports and flags endpoints that got slower or lost throughput.
+#   python -m benchmarks.compare benchmarks/results/old.json benchmarks/results/new.json --threshold 10
+import argparse
+import json
+import sys
+
+METRICS = [
+    ("sequential", "p50_ms", "lower"),
+    ("sequential", "p95_ms", "lower"),
+    ("sequential", "p99_ms", "lower"),
+    ("concurrent", "p95_ms", "lower"),
+    ("concurrent", "throughput_rps", "higher"),
+]
+
+
+def _change(old, new):
+    if not old:
+        return None
+    return (new - old) / old * 100
+
+
+def compare(baseline, candidate, threshold):
+    rows, regressions = [], []
+    for name, new_result in candidate["results"].items():
+        old_result = baseline["results"].get(name)
+        if old_result is None:
+            continue
+        for section, metric, better in METRICS:
+            old = old_result[section].get(metric)
+            new = new_result[section].get(metric)
+            if old is None or new is None:
+                continue
+            change = _change(old, new)
+            regressed = change is not None and (change > threshold if better == "lower" else change < -threshold)
+            rows.append((name, f"{section}.{metric}", old, new, change, regressed))
+            if regressed:
+                regressions.append(name)
+
+        old_alloc, new_alloc = old_result.get("peak_python_alloc_bytes"), new_result.get("peak_python_alloc_bytes")
+        if old_alloc and new_alloc:
+            change = _change(old_alloc, new_alloc)
+            regressed = change > threshold
+            rows.append((name, "peak_python_alloc_bytes", old_alloc, new_alloc, change, regressed))
+            if regressed:
+                regressions.append(name)
+    return rows, sorted(set(regressions))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare two load_test reports")
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=10.0, help="Allowed change in percent")
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+
+    rows, regressions = compare(baseline, candidate, args.threshold)
+    print(f"{'endpoint':<32} {'metric':<28} {'baseline':>12} {'candidate':>12} {'change':>9}")
+    for name, metric, old, new, change, regressed in rows:
+        flag = "  REGRESSION" if regressed else ""
+        print(f"{name:<32} {metric:<28} {old:>12.2f} {new:>12.2f} {change:>8.1f}%{flag}")
+
+    if regressions:
+        print(f"Regressions beyond {args.threshold}%: {', '.join(regressions)}")
+        sys.exit(1)
@@ -0,0 +1,84 @@
+# Measures the cold import cost of the API and each service module.
+# Run from Predictive_model/: python -m benchmarks.import_time --repeat 5
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+from datetime import datetime
+
+MODULES = [
+    "main",
+    "app.routes",
+    "services.driver_behavior",
+    "services.fleet_utilization",
+    "services.predictive_maintenance.failure_analysis",
+    "services.predictive_maintenance.failure_analysis_batch",
+    "services.predictive_maintenance.forecast_next_replacement",
+    "services.vehicle_health_monitor.vehicle_health",
+    "prophet",
+    "sklearn.ensemble",
+    "mlxtend.frequent_patterns",
+]
+
+SNIPPET = (
+    "import importlib, time; started = time.perf_counter(); "
+    "importlib.import_module({module!r}); print((time.perf_counter() - started) * 1000)"
+)
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(PROJECT_DIR, "benchmarks", "results")
+
+
+def time_import(module, repeat):
+    # Each sample runs in a fresh interpreter so nothing is already in sys.modules
+    samples = []
+    for _ in range(repeat):
+        completed = subprocess.run(
+            [sys.executable, "-c", SNIPPET.format(module=module)],
+            capture_output=True, text=True, cwd=PROJECT_DIR
+        )
+        if completed.returncode != 0:
+            return {"error": completed.stderr.strip().splitlines()[-1] if completed.stderr else "import failed"}
+        samples.append(float(completed.stdout.strip().splitlines()[-1]))
+
+    return {
+        "median_ms": round(statistics.median(samples), 2),
+        "min_ms": round(min(samples), 2),
+        "max_ms": round(max(samples), 2),
+        "samples_ms": [round(sample, 2) for sample in samples]
+    }
+
+
+def run(repeat=3, output=None):
+    results = {module: time_import(module, repeat) for module in MODULES}
+    report = {
+        "benchmark": "import_time",
+        "created_on": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "repeat": repeat,
+        "results": results
+    }
+
+    output = output or os.path.join(RESULTS_DIR, f"import_time_{datetime.now():%Y%m%d_%H%M%S}.json")
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    return report, output
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark per-module import time")
+    parser.add_argument("--repeat", type=int, default=3, help="Fresh-interpreter samples per module")
+    parser.add_argument("--output", default=None, help="Where to write the JSON report")
+    args = parser.parse_args()
+
+    report, output = run(repeat=args.repeat, output=args.output)
+    for module, result in report["results"].items():
+        if "error" in result:
+            print(f"{module:<60} ERROR {result['error']}")
+        else:
+            print(f"{module:<60} {result['median_ms']:>10.2f} ms")
+    print(f"Report written to {output}")
@@ -0,0 +1,303 @@
+# End-to-end load test for every route in app/routes.py.
+# In-process (Flask test client, includes peak Python allocation per endpoint):
+#   DATABASE_URL=postgresql://postgres@localhost/fleet_bench python -m benchmarks.load_test
+# Against a running server (RSS sampled from /proc during each endpoint when --server-pid is given):
+#   python -m benchmarks.load_test --base-url http://localhost:5000 --server-pid 1234
+import argparse
+import json
+import os
+import platform
+import subprocess
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from datetime import datetime
+
+import numpy as np
+
+from benchmarks.synthetic_data import vehicle_number
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks", "results")
+
+
+def build_endpoints(vehicle, driver_id, start_date, end_date):
+    # (name, method, path, query params, heavy); heavy endpoints get fewer iterations
+    return [
+        ("get_vehicle_list", "GET", "/get-vehicle-list", {}, False),
+        ("driver_behavior", "GET", "/driver_behavior", {"driver_id": driver_id}, False),
+        ("predictive_maintenance", "GET", "/predictive_maintenance", {}, True),
+        ("predictive_maintenance_vehicle", "GET", "/predictive_maintenance", {"vehicle_reg_no": vehicle}, True),
+        ("fleet_heatmap", "GET", "/generate-fleet-heatmap", {}, False),
+        ("fleet_heatmap_vehicle", "GET", "/generate-fleet-heatmap",
+         {"vehicle_id": vehicle, "start_date": start_date, "end_date": end_date}, False),
+        ("vehicle_health_fleet", "GET", "/vehicle-health-status", {}, False),
+        ("vehicle_health_vehicle", "GET", "/vehicle-health-status", {"vehicle_reg_no": vehicle}, False),
+        ("vehicle_health_stream", "GET", "/vehicle-health-status/stream", {}, True),
+        ("failure_analysis", "GET", "/failure-analysis", {"vehicle_number": vehicle}, False),
+        ("failure_analysis_batch", "POST", "/failure-analysis/batch", {}, True),
+        ("job_submit", "POST", "/jobs/failure_analysis", {"vehicle_number": vehicle}, False),
+        ("metrics", "GET", "/metrics", {}, False),
+        ("db_stats", "GET", "/db-stats", {}, False),
+        ("health", "GET", "/health", {}, False),
+    ]
+
+
+class InProcessClient:
+    def __init__(self):
+        from main import app
+        self.client = app.test_client()
+
+    def request(self, method, path, params):
+        response = self.client.open(path, method=method, query_string=params)
+        body = response.get_data()
+        return response.status_code, len(body)
+
+    def json(self, method, path, params):
+        return self.client.open(path, method=method, query_string=params).get_json(silent=True) or {}
+
+
+class HttpClient:
+    def __init__(self, base_url):
+        import requests
+        self.base_url = base_url.rstrip("/")
+        self.session = requests.Session()
+
+    def request(self, method, path, params):
+        response = self.session.request(method, self.base_url + path, params=params)
+        return response.status_code, len(response.content)
+
+    def json(self, method, path, params):
+        try:
+            return self.session.request(method, self.base_url + path, params=params).json()
+        except ValueError:
+            return {}
+
+
+def _wait_for_job(client, job_id, timeout, interval=1.0):
+    deadline = time.monotonic() + timeout
+    while True:
+        job = client.json("GET", f"/jobs/{job_id}", {})
+        if job.get("status") not in ("queued", "running"):
+            return job
+        if time.monotonic() > deadline:
+            raise RuntimeError(f"Job {job_id} did not finish within {timeout}s")
+        time.sleep(interval)
+
+
+def build_dynamic_endpoints(client, vehicle, batch_timeout):
+    # Routes keyed by ids that only exist after a job or batch run has been started
+    endpoints = []
+    job = client.json("POST", "/jobs/failure_analysis", {"vehicle_number": vehicle})
+    if job.get("job_id"):
+        endpoints.append(("job_status", "GET", f"/jobs/{job['job_id']}", {}, False))
+        endpoints.append(("job_result", "GET", f"/jobs/{job['job_id']}/result", {}, False))
+        endpoints.append(("job_cancel", "DELETE", f"/jobs/{job['job_id']}", {}, False))
+
+    # The batch runs as a job; its run_id is only in the finished job's result
+    batch = client.json("POST", "/failure-analysis/batch", {})
+    if not batch.get("job_id"):
+        raise RuntimeError(f"POST /failure-analysis/batch did not start a job: {batch}")
+    finished = _wait_for_job(client, batch["job_id"], batch_timeout)
+    run_id = client.json("GET", f"/jobs/{batch['job_id']}/result", {}).get("run_id")
+    if not run_id:
+        raise RuntimeError(f"Batch job {batch['job_id']} finished without a run_id: {finished}")
+    endpoints.append(("failure_analysis_batch_results", "GET", f"/failure-analysis/batch/{run_id}", {}, False))
+    return endpoints
+
+
+def _timed(client, method, path, params):
+    started = time.perf_counter()
+    try:
+        status, size = client.request(method, path, params)
+    except Exception:
+        status, size = "error", 0
+    return (time.perf_counter() - started) * 1000, status, size
+
+
+def _summary(latencies):
+    values = np.array(latencies)
+    return {
+        "mean_ms": round(float(values.mean()), 2),
+        "p50_ms": round(float(np.percentile(values, 50)), 2),
+        "p90_ms": round(float(np.percentile(values, 90)), 2),
+        "p95_ms": round(float(np.percentile(values, 95)), 2),
+        "p99_ms": round(float(np.percentile(values, 99)), 2),
+        "max_ms": round(float(values.max()), 2),
+    }
+
+
+def _status_kb(pids, field):
+    total = 0
+    for pid in pids:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    total += int(line.split()[1])
+    return total
+
+
+def _reset_peak_rss(pids):
+    # Writing 5 to clear_refs resets VmHWM to the current RSS, so it becomes a per-endpoint peak.
+    # Needs Linux 4.0+ and permission to write to the server's /proc entry.
+    try:
+        for pid in pids:
+            with open(f"/proc/{pid}/clear_refs", "w") as f:
+                f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+class RssSampler:
+    # Tracks the server's summed RSS while one endpoint runs. VmHWM alone is a lifetime peak, so
+    # it only counts when it could be reset first; sampling VmRSS covers the other case.
+    def __init__(self, pids, interval=0.05):
+        self.pids = pids
+        self.interval = interval
+        self._stop = threading.Event()
+
+    def __enter__(self):
+        self.start_kb = _status_kb(self.pids, "VmRSS")
+        self.peak_kb = self.start_kb
+        self.hwm_reset = _reset_peak_rss(self.pids)
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self.peak_kb = max(self.peak_kb, _status_kb(self.pids, "VmRSS"))
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak_kb = max(self.peak_kb, _status_kb(self.pids, "VmRSS"))
+        if self.hwm_reset:
+            # Also catches spikes shorter than the sampling interval
+            self.peak_kb = max(self.peak_kb, _status_kb(self.pids, "VmHWM"))
+
+    def to_dict(self):
+        return {
+            "server_rss_start_kb": self.start_kb,
+            "server_peak_rss_kb": self.peak_kb,
+            "server_rss_growth_kb": self.peak_kb - self.start_kb,
+            "server_peak_source": "vmhwm_reset" if self.hwm_reset else "sampled",
+        }
+
+
+def benchmark_endpoint(client, endpoint, iterations, concurrency, in_process, server_pids):
+    name, method, path, params, heavy = endpoint
+    if heavy:
+        iterations = max(1, iterations // 10)
+
+    sampler = RssSampler(server_pids) if server_pids else None
+    with sampler or nullcontext():
+        # First call separately: it pays for lazy imports, model loads and cold caches
+        if in_process:
+            tracemalloc.start()
+        cold_ms, cold_status, _ = _timed(client, method, path, params)
+        peak_alloc = tracemalloc.get_traced_memory()[1] if in_process else None
+        if in_process:
+            tracemalloc.stop()
+
+        sequential = [_timed(client, method, path, params) for _ in range(iterations)]
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            concurrent = list(executor.map(lambda _: _timed(client, method, path, params), range(iterations)))
+        wall_seconds = time.perf_counter() - started
+
+    statuses = {}
+    for _, status, _ in sequential + concurrent:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+
+    return {
+        "method": method,
+        "path": path,
+        "params": params,
+        "cold_ms": round(cold_ms, 2),
+        "cold_status": cold_status,
+        "iterations": iterations,
+        "sequential": _summary([latency for latency, _, _ in sequential]),
+        "concurrent": {
+            **_summary([latency for latency, _, _ in concurrent]),
+            "concurrency": concurrency,
+            "throughput_rps": round(iterations / wall_seconds, 2) if wall_seconds else None,
+        },
+        "response_bytes": sequential[-1][2] if sequential else None,
+        "status_counts": statuses,
+        "peak_python_alloc_bytes": peak_alloc,
+        **(sampler.to_dict() if sampler else {"server_peak_rss_kb": None}),
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def run(args):
+    if args.disable_cache:
+        # Read by app.config at import time, so it has to be set before the app is loaded
+        os.environ["RESPONSE_CACHE_ENABLED"] = "false"
+
+    in_process = not args.base_url
+    client = InProcessClient() if in_process else HttpClient(args.base_url)
+    endpoints = build_endpoints(args.vehicle_number, args.driver_id, args.start_date, args.end_date)
+    endpoints += build_dynamic_endpoints(client, args.vehicle_number, args.batch_timeout)
+    if args.only:
+        endpoints = [endpoint for endpoint in endpoints if endpoint[0] in args.only]
+
+    results = {}
+    for endpoint in endpoints:
+        print(f"Benchmarking {endpoint[0]} ...")
+        results[endpoint[0]] = benchmark_endpoint(client, endpoint, args.iterations, args.concurrency,
+                                                  in_process, args.server_pid)
+
+    report = {
+        "benchmark": "load_test",
+        "created_on": datetime.now().isoformat(),
+        "git_commit": _git_commit(),
+        "python": platform.python_version(),
+        "mode": "in_process" if in_process else "http",
+        "response_cache": not args.disable_cache,
+        "iterations": args.iterations,
+        "concurrency": args.concurrency,
+        "results": results,
+    }
+
+    output = args.output or os.path.join(RESULTS_DIR, f"load_test_{datetime.now():%Y%m%d_%H%M%S}.json")
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2, default=str)
+    return report, output
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Latency, throughput and memory benchmark for every route")
+    parser.add_argument("--base-url", default=None, help="Benchmark a running server instead of the app in-process")
+    parser.add_argument("--server-pid", type=int, nargs="*", default=None, help="Server PIDs (e.g. every gunicorn worker) to sample RSS from")
+    parser.add_argument("--iterations", type=int, default=50, help="Requests per endpoint per phase")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent clients in the throughput phase")
+    parser.add_argument("--disable-cache", action="store_true", help="Turn the response cache off (in-process only)")
+    parser.add_argument("--vehicle-number", default=vehicle_number(0), help="Vehicle used for per-vehicle routes")
+    parser.add_argument("--driver-id", type=int, default=1)
+    parser.add_argument("--start-date", default="2024-01-01")
+    parser.add_argument("--end-date", default="2024-01-07")
+    parser.add_argument("--batch-timeout", type=float, default=600,
+                        help="Seconds to wait for the fleet batch job that provides a run_id")
+    parser.add_argument("--only", nargs="*", default=None, help="Only run these endpoint names")
+    parser.add_argument("--output", default=None, help="Where to write the JSON report")
+    args = parser.parse_args()
+
+    report, output = run(args)
+    print(f"{'endpoint':<32} {'cold':>10} {'p50':>10} {'p95':>10} {'p99':>10} {'rps':>10}")
+    for name, result in report["results"].items():
+        print(f"{name:<32} {result['cold_ms']:>10.1f} {result['sequential']['p50_ms']:>10.1f} "
+              f"{result['sequential']['p95_ms']:>10.1f} {result['sequential']['p99_ms']:>10.1f} "
+              f"{result['concurrent']['throughput_rps'] or 0:>10.1f}")
+    print(f"Report written to {output}")
@@ -0,0 +1,225 @@
+# Deterministic synthetic fleet dataset for benchmarking without the live database.
+# Loads into a local Postgres (the services rely on Postgres SQL such as ::int casts,
+# INTERVAL arithmetic and EXTRACT(EPOCH ...)), e.g.:
+#   createdb fleet_bench
+#   python -m benchmarks.synthetic_data --database-url postgresql://postgres@localhost/fleet_bench \
+#       --vehicles 50 --days 60
+import argparse
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine, text
+
+BASE_TIME = datetime(2024, 1, 1)
+COMPANY_IDS = [1, 2]
+VEHICLE_TYPES = {1: ("Truck", 60), 2: ("Van", 80), 3: ("Tanker", 50)}
+
+SPARES = [
+    ("Brake Pad", 1200.0), ("Clutch Plate", 3500.0), ("Battery", 5400.0), ("Air Filter", 450.0),
+    ("Oil Filter", 300.0), ("Tyre", 8200.0), ("Radiator Hose", 650.0), ("Alternator Belt", 900.0),
+]
+
+FAILURE_REASONS = [
+    "brake pad worn out", "brake noise while stopping", "clutch slipping under load",
+    "battery not holding charge", "battery terminal corrosion", "engine overheating radiator leak",
+    "air filter clogged with dust", "oil filter blocked", "tyre puncture on highway",
+    "tyre tread worn", "alternator belt squeal", "low charging voltage alternator",
+]
+
+PRIMARY_KEYS = {
+    "vehicle": "vehicle_id",
+    "map_vehicle_type": None,
+    "tracking_data": "id",
+    "spare_replacement": "replacement_id",
+    "spares_inventory_depot": "spare_id",
+    "trip_details": "trip_id",
+    "driver_details": "driver_id",
+    "alerts": "alert_id",
+}
+
+INDEXES = [
+    "CREATE INDEX ON tracking_data (vehicle_reg_no, vehicle_timestamp)",
+    "CREATE INDEX ON tracking_data (vehicle_timestamp)",
+    "CREATE INDEX ON spare_replacement (vehicle_id)",
+    "CREATE INDEX ON trip_details (driver_id)",
+    "CREATE INDEX ON alerts (trip_id)",
+]
+
+
+def vehicle_number(index):
+    return f"TN{10 + index % 80:02d}Z{1000 + index:04d}"
+
+
+def generate_vehicles(n_vehicles, rng):
+    vehicle_ids = np.arange(1, n_vehicles + 1)
+    return pd.DataFrame({
+        "vehicle_id": vehicle_ids,
+        "vehicle_number": [vehicle_number(i) for i in range(n_vehicles)],
+        "vehicle_type_id": rng.choice(list(VEHICLE_TYPES), size=n_vehicles),
+        "company_id": rng.choice(COMPANY_IDS, size=n_vehicles),
+    })
+
+
+def generate_vehicle_types():
+    return pd.DataFrame([
+        {"vehicle_type_id": type_id, "company_id": company_id, "vehicle_type": name, "speed_limit": limit}
+        for type_id, (name, limit) in VEHICLE_TYPES.items()
+        for company_id in COMPANY_IDS
+    ])
+
+
+def generate_drivers(n_drivers):
+    return pd.DataFrame({
+        "driver_id": np.arange(1, n_drivers + 1),
+        "driver_name": [f"Driver {i:03d}" for i in range(1, n_drivers + 1)],
+    })
+
+
+def generate_spares(rng):
+    return pd.DataFrame({
+        "spare_id": np.arange(1, len(SPARES) + 1),
+        "spare_name": [name for name, _ in SPARES],
+        "unit_price": [price for _, price in SPARES],
+        "quantity_available": rng.integers(5, 200, size=len(SPARES)),
+    })
+
+
+def generate_tracking(vehicles, days, points_per_day, rng):
+    n_vehicles = len(vehicles)
+    n_points = days * points_per_day
+    step = timedelta(days=1) / points_per_day
+
+    frames = []
+    next_id = 1
+    for vehicle in vehicles.itertuples(index=False):
+        timestamps = pd.date_range(BASE_TIME, periods=n_points, freq=step)
+        speed = np.clip(rng.normal(40, 20, n_points), 0, 120).round(1)
+        # Parked stretches so idling and ignition cycles show up
+        parked = rng.random(n_points) < 0.15
+        speed[parked] = 0
+
+        lat = 13.0 + rng.normal(0, 0.05, 1)[0] + np.cumsum(rng.normal(0, 0.001, n_points))
+        lng = 80.2 + rng.normal(0, 0.05, 1)[0] + np.cumsum(rng.normal(0, 0.001, n_points))
+        lat[rng.random(n_points) < 0.01] = 0
+
+        frames.append(pd.DataFrame({
+            "id": np.arange(next_id, next_id + n_points),
+            "vehicle_reg_no": vehicle.vehicle_number,
+            "vehicle_timestamp": timestamps,
+            "created_on": timestamps + pd.to_timedelta(rng.integers(0, 120, n_points), unit="s"),
+            "speed": speed,
+            "heading": rng.integers(0, 360, n_points),
+            "ignition_status": np.where(parked & (rng.random(n_points) < 0.5), "OFF", "ON"),
+            "latitude": np.round(lat, 6).astype(str),
+            "longitude": np.round(lng, 6).astype(str),
+            "main_input_voltage": rng.normal(12.4, 0.6, n_points).round(2),
+            "internal_battery_voltage": rng.normal(3.9, 0.2, n_points).round(2),
+            "main_power_status": np.where(rng.random(n_points) < 0.02, "0", "1"),
+            "gps_fix": np.where(rng.random(n_points) < 0.03, "0", "1"),
+            "tamper_alert": np.where(rng.random(n_points) < 0.01, "O", None),
+            "emergency_status": (rng.random(n_points) < 0.005).astype(int),
+        }))
+        next_id += n_points
+
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+
+def generate_replacements(vehicles, spares, days, rng):
+    rows = []
+    replacement_id = 1
+    for vehicle in vehicles.itertuples(index=False):
+        for spare in spares.itertuples(index=False):
+            # Roughly one replacement per spare every few weeks, so Prophet has a series to fit
+            n_replacements = rng.poisson(max(days / 20, 1))
+            offsets = np.sort(rng.integers(0, max(days, 1), size=n_replacements))
+            for offset in offsets:
+                rows.append({
+                    "replacement_id": replacement_id,
+                    "vehicle_id": vehicle.vehicle_id,
+                    "spares_inventory_depot_id": spare.spare_id,
+                    "replaced_on": BASE_TIME + timedelta(days=int(offset), hours=int(rng.integers(8, 18))),
+                    "reason": FAILURE_REASONS[rng.integers(0, len(FAILURE_REASONS))],
+                })
+                replacement_id += 1
+    return pd.DataFrame(rows)
+
+
+def generate_trips(vehicles, drivers, days, rng):
+    rows = []
+    trip_id = 1
+    for vehicle in vehicles.itertuples(index=False):
+        # Each vehicle is mostly driven by one regular driver
+        driver_id = int(drivers["driver_id"].iloc[(vehicle.vehicle_id - 1) % len(drivers)])
+        for day in range(0, days, 2):
+            start = BASE_TIME + timedelta(days=day, hours=int(rng.integers(5, 10)))
+            distance = int(rng.integers(40, 300))
+            rows.append({
+                "trip_id": trip_id,
+                "vehicle_id": vehicle.vehicle_id,
+                "driver_id": driver_id,
+                "start_date": start,
+                "end_date": start + timedelta(hours=distance / 60 + float(rng.normal(0.5, 1.0))),
+                "total_distance": f"{distance}km",
+            })
+            trip_id += 1
+    return pd.DataFrame(rows)
+
+
+def generate_alerts(trips, rng):
+    flagged = trips[rng.random(len(trips)) < 0.2]
+    return pd.DataFrame({
+        "alert_id": np.arange(1, len(flagged) + 1),
+        "trip_id": flagged["trip_id"].values,
+        "vehicle_id": flagged["vehicle_id"].values,
+        "alert_type": rng.choice(["deviate", "overspeed", "idle"], size=len(flagged)),
+        "created_on": flagged["start_date"].values,
+    })
+
+
+def generate_dataset(n_vehicles=20, days=30, points_per_day=96, seed=42):
+    rng = np.random.default_rng(seed)
+    vehicles = generate_vehicles(n_vehicles, rng)
+    drivers = generate_drivers(max(1, n_vehicles))
+    spares = generate_spares(rng)
+    trips = generate_trips(vehicles, drivers, days, rng)
+
+    return {
+        "vehicle": vehicles,
+        "map_vehicle_type": generate_vehicle_types(),
+        "driver_details": drivers,
+        "spares_inventory_depot": spares,
+        "tracking_data": generate_tracking(vehicles, days, points_per_day, rng),
+        "spare_replacement": generate_replacements(vehicles, spares, days, rng),
+        "trip_details": trips,
+        "alerts": generate_alerts(trips, rng),
+    }
+
+
+def load_dataset(dataset, database_url):
+    engine = create_engine(database_url)
+    with engine.begin() as conn:
+        for table, df in dataset.items():
+            df.to_sql(table, conn, if_exists="replace", index=False, chunksize=10000, method="multi")
+            if PRIMARY_KEYS[table]:
+                conn.execute(text(f"ALTER TABLE {table} ADD PRIMARY KEY ({PRIMARY_KEYS[table]})"))
+        for statement in INDEXES:
+            conn.execute(text(statement))
+        conn.execute(text("ANALYZE"))
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate and load a synthetic fleet dataset")
+    # No default on purpose: this replaces tables, so never point it at a real database
+    parser.add_argument("--database-url", required=True, help="Target Postgres URL (tables are replaced)")
+    parser.add_argument("--vehicles", type=int, default=20, help="Fleet size")
+    parser.add_argument("--days", type=int, default=30, help="Days of history")
+    parser.add_argument("--points-per-day", type=int, default=96, help="Tracking points per vehicle per day")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    dataset = generate_dataset(args.vehicles, args.days, args.points_per_day, args.seed)
+    load_dataset(dataset, args.database_url)
+    for table, df in dataset.items():
+        print(f"{table:<25} {len(df):>10} rows")
@@ -0,0 +1,71 @@
+# Production server: gunicorn -c gunicorn.conf.py wsgi:app
+import os
+import shutil
+import tempfile
+
+# Workers share /metrics and /db-stats through prometheus_client's multiprocess files. This has
+# to be set before the app (and so prometheus_client) is preloaded. A directory the operator
+# supplies is never wiped: stale files from an earlier run would skew the counters, so it must
+# start empty. Otherwise a fresh one is created and removed again on exit.
+metrics_dir = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+owns_metrics_dir = not metrics_dir
+if owns_metrics_dir:
+    metrics_dir = os.environ["PROMETHEUS_MULTIPROC_DIR"] = tempfile.mkdtemp(prefix="vts-metrics-")
+else:
+    os.makedirs(metrics_dir, exist_ok=True)
+    if os.listdir(metrics_dir):
+        raise RuntimeError(f"PROMETHEUS_MULTIPROC_DIR {metrics_dir} is not empty; clear it or unset it "
+                           "to use a new temporary directory")
+
+from app.config import WEB_BIND, WEB_GRACEFUL_TIMEOUT, WEB_THREADS, WEB_TIMEOUT, WEB_WORKERS
+
+bind = WEB_BIND
+workers = WEB_WORKERS
+threads = WEB_THREADS
+worker_class = "gthread"
+timeout = WEB_TIMEOUT
+graceful_timeout = WEB_GRACEFUL_TIMEOUT
+preload_app = True
+
+
+def when_ready(server):
+    from app import jobs
+    from wsgi import warmup_timings
+
+    server.log.info("Warm-up finished: %s", warmup_timings)
+    # Jobs run in one process shared by all workers, so status polls and de-duplication work
+    # no matter which worker a request lands on
+    server.log.info("Job process started (pid %s)", jobs.start_server())
+
+
+def post_fork(server, worker):
+    from app import jobs
+    from app.config import engine, replica_engine
+
+    # Pooled connections opened in the master must not be shared with the children
+    engine.dispose(close=False)
+    replica_engine.dispose(close=False)
+    jobs.connect()
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
+
+
+def worker_exit(server, worker):
+    from app import jobs
+    from app.config import engine, replica_engine
+
+    jobs.shutdown(wait=False)
+    engine.dispose()
+    replica_engine.dispose()
+
+
+def on_exit(server):
+    from app import jobs
+
+    jobs.stop_server(WEB_GRACEFUL_TIMEOUT)
+    if owns_metrics_dir:
+        shutil.rmtree(metrics_dir, ignore_errors=True)
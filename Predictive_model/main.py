@@ -1,18 +1,17 @@
+import os
 from flask import Flask
 from flask_cors import CORS
-from sqlalchemy.orm import scoped_session
-from app.config import SessionLocal
-from app import routes
+from app import metrics, routes
+from app.warmup import start_background_warmup
 
 app = Flask(__name__)
-CORS(app) 
-db_session = scoped_session(SessionLocal)
-
-@app.teardown_appcontext
-def remove_session(exception=None):
-    db_session.remove()
+CORS(app, expose_headers=["Server-Timing", "ETag", "X-Cache", "Location"])
+metrics.init_app(app)
 
 app.register_blueprint(routes.routes)
 
 if __name__ == "__main__":
+    # Only the reloader's child serves requests, so only it warms up
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        start_background_warmup()
     app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
@@ -1,10 +1,93 @@
-from sqlalchemy import text
-from sqlalchemy.orm import Session
+from sqlalchemy import bindparam, text
 import pandas as pd
+from app import tracking_mirror
+from app.db import fetch_all, fetch_one, fetch_scalar, read_sql
+from app.metrics import stage
+from app.reference_data import get_reference_data
 
 
-def get_driver_behavior_metrics(db: Session) -> pd.DataFrame:
-    query = text("""
+def get_driver_behavior_metrics_from_mirror(vehicle_reg_no=None) -> pd.DataFrame:
+    # Trip counts come from the database, the vehicle and speed limit joins from the cached
+    # reference tables, and tracking rows from the mirror
+    vehicles = get_reference_data().vehicle_speed_limits
+    if vehicle_reg_no:
+        vehicles = vehicles[vehicles["vehicle_number"] == vehicle_reg_no]
+
+    trips_query = """
+        SELECT tp.vehicle_id, d.driver_name, COUNT(*) AS trip_count
+        FROM trip_details tp
+        JOIN driver_details d ON d.driver_id = tp.driver_id
+    """
+    params = {}
+    if vehicle_reg_no:
+        trips_query += " WHERE tp.vehicle_id IN :vehicle_ids"
+        params["vehicle_ids"] = [int(vehicle_id) for vehicle_id in vehicles["vehicle_id"]]
+    trips_query += " GROUP BY tp.vehicle_id, d.driver_name"
+    if vehicle_reg_no:
+        trips_query = text(trips_query).bindparams(bindparam("vehicle_ids", expanding=True))
+    trips_df = read_sql(trips_query, params=params, replica=True, name="driver_vehicle_trips")
+
+    trips_df = trips_df.merge(
+        vehicles[["vehicle_id", "vehicle_number", "speed_limit"]].rename(columns={"vehicle_number": "vehicle_reg_no"}),
+        on="vehicle_id"
+    )
+    trips_df = trips_df.groupby(["driver_name", "vehicle_reg_no", "speed_limit"], as_index=False)["trip_count"].sum()
+
+    track_df = tracking_mirror.read_tracking(
+        columns=["vehicle_reg_no", "speed", "heading", "ignition_status", "vehicle_timestamp"],
+        vehicle_reg_no=vehicle_reg_no or list(trips_df["vehicle_reg_no"].unique())
+    )
+
+    with stage("transform"):
+        track_df = track_df.sort_values(["vehicle_reg_no", "vehicle_timestamp"])
+        previous = track_df.groupby("vehicle_reg_no")[["speed", "heading", "vehicle_timestamp"]].shift()
+        seconds = (track_df["vehicle_timestamp"] - previous["vehicle_timestamp"]).dt.total_seconds()
+        acceleration = (track_df["speed"] - previous["speed"]) / seconds.where(seconds != 0)
+        heading_diff = (track_df["heading"] - previous["heading"]).abs()
+
+        # In the SQL version each tracking row is repeated once per trip by the trip join, and the
+        # copies tie on vehicle_timestamp. Point-in-time metrics therefore count once per trip of
+        # each driver. Lagged metrics only differ from zero on whichever copy sorts first, so each
+        # row counts once per vehicle, credited to the driver of an arbitrary trip.
+        track_df = track_df.assign(
+            harsh_accel_count=(acceleration > 3).astype(int),
+            harsh_brake_count=(acceleration < -3).astype(int),
+            rash_turn_count=((heading_diff > 45) & (track_df["speed"] > 30)).astype(int),
+            idle_time_points=((track_df["speed"] < 2) & (track_df["ignition_status"] == 'ON')).astype(int)
+        )
+        per_vehicle = track_df.groupby("vehicle_reg_no")[
+            ["harsh_accel_count", "harsh_brake_count", "rash_turn_count", "idle_time_points"]
+        ].sum().reset_index()
+
+        limits = trips_df[["vehicle_reg_no", "speed_limit"]].drop_duplicates()
+        overspeed = track_df[["vehicle_reg_no", "speed"]].merge(limits, on="vehicle_reg_no")
+        overspeed = (overspeed["speed"] > overspeed["speed_limit"]).groupby(
+            [overspeed["vehicle_reg_no"], overspeed["speed_limit"]]
+        ).sum().rename("overspeed_count").reset_index()
+
+        df = trips_df.merge(per_vehicle, on="vehicle_reg_no").merge(
+            overspeed, on=["vehicle_reg_no", "speed_limit"], how="left"
+        )
+        df["overspeed_count"] = df["overspeed_count"].fillna(0) * df["trip_count"]
+        df["idle_time_points"] = df["idle_time_points"] * df["trip_count"]
+        # That arbitrary pick cannot be reproduced, so the lagged counts of a shared vehicle are
+        # split by each driver's share of its trips: the expected SQL value, with the same per
+        # vehicle total. A vehicle with one driver gets exactly the SQL counts.
+        trip_share = df["trip_count"] / df.groupby("vehicle_reg_no")["trip_count"].transform("sum")
+        for column in ("harsh_accel_count", "harsh_brake_count", "rash_turn_count"):
+            df[column] = df[column] * trip_share
+
+        return df.groupby(["driver_name", "vehicle_reg_no"], as_index=False)[
+            ["harsh_accel_count", "harsh_brake_count", "rash_turn_count", "idle_time_points", "overspeed_count"]
+        ].sum()
+
+
+def get_driver_behavior_metrics(vehicle_reg_no=None) -> pd.DataFrame:
+    if tracking_mirror.is_available():
+        return get_driver_behavior_metrics_from_mirror(vehicle_reg_no)
+
+    vehicle_filter = "WHERE td.vehicle_reg_no = :vehicle_reg_no" if vehicle_reg_no else ""
+    query = text(f"""
         WITH tracking_metrics AS (
             SELECT
                 td.vehicle_reg_no,
@@ -26,6 +109,7 @@ def get_driver_behavior_metrics(db: Session) -> pd.DataFrame:
             JOIN map_vehicle_type mvt ON v.vehicle_type_id = mvt.vehicle_type_id AND v.company_id = mvt.company_id
             JOIN trip_details tp ON tp.vehicle_id = v.vehicle_id
             JOIN driver_details d ON d.driver_id = tp.driver_id
+            {vehicle_filter}
         )
         SELECT
             driver_name,
@@ -38,10 +122,11 @@ def get_driver_behavior_metrics(db: Session) -> pd.DataFrame:
         FROM tracking_metrics
         GROUP BY driver_name, vehicle_reg_no;
     """)
-    return pd.read_sql(query, db.bind)
+    params = {"vehicle_reg_no": vehicle_reg_no} if vehicle_reg_no else {}
+    return read_sql(query, params=params, replica=True, name="driver_behavior_metrics")
 
 
-def get_route_deviation_count(db: Session, vehicle_id: int, trip_id: int) -> int:
+def get_route_deviation_count(vehicle_id: int, trip_id: int) -> int:
     query = text("""
         SELECT COUNT(DISTINCT a.alert_id) AS deviation_count
         FROM alerts a
@@ -50,29 +135,27 @@ def get_route_deviation_count(db: Session, vehicle_id: int, trip_id: int) -> int
           AND a.vehicle_id = :vehicle_id
           AND td.trip_id = :trip_id
     """)
-    result = db.execute(query, {"vehicle_id": vehicle_id, "trip_id": trip_id}).mappings().fetchone()
-    return result['deviation_count'] if result else 0
+    result = fetch_one(query, {"vehicle_id": vehicle_id, "trip_id": trip_id}, replica=True, name="route_deviation_count")
+    return result.deviation_count if result else 0
 
 
-def get_time_deviation(db: Session, trip_id: int) -> float:
+def get_time_deviation(trip_id: int) -> float:
     query = text("""
         SELECT start_date, end_date,
                CAST(REPLACE(total_distance, 'km', '') AS FLOAT) AS total_distance
         FROM trip_details
         WHERE trip_id = :trip_id
     """)
-    result = db.execute(query, {"trip_id": trip_id}).mappings().fetchone()
-    if not result or not result['start_date'] or not result['end_date']:
+    result = fetch_one(query, {"trip_id": trip_id}, replica=True, name="trip_time_deviation")
+    if not result or not result.start_date or not result.end_date:
         return 0
 
-    expected_duration = result['total_distance'] / 60  # Assuming avg speed = 60 km/h
-    actual_duration = (result['end_date'] - result['start_date']).total_seconds() / 3600
+    expected_duration = result.total_distance / 60  # Assuming avg speed = 60 km/h
+    actual_duration = (result.end_date - result.start_date).total_seconds() / 3600
     deviation = actual_duration - expected_duration
     return deviation if deviation > 1 else 0
 
-def get_driver_risk_profile_by_id(db: Session, driver_id: int):
-    behavior_df = get_driver_behavior_metrics(db)
-
+def get_driver_risk_profile_by_id(driver_id: int):
     # Fetch driver and vehicle info
     driver_query = text("""
         SELECT DISTINCT d.driver_id, d.driver_name, v.vehicle_number
@@ -82,12 +165,15 @@ def get_driver_risk_profile_by_id(db: Session, driver_id: int):
         WHERE d.driver_id = :driver_id
         LIMIT 1
     """)
-    driver = db.execute(driver_query, {"driver_id": driver_id}).mappings().fetchone()
+    driver = fetch_one(driver_query, {"driver_id": driver_id}, replica=True, name="driver_vehicle")
     if not driver:
         return {"error": "Driver not found."}
 
-    vehicle_number = driver["vehicle_number"]
-    driver_name = driver["driver_name"]
+    vehicle_number = driver.vehicle_number
+    driver_name = driver.driver_name
+
+    # Only the driver's vehicle is needed, so let the metrics query prune to it
+    behavior_df = get_driver_behavior_metrics(vehicle_reg_no=vehicle_number)
 
     behavior_row = behavior_df[behavior_df['vehicle_reg_no'] == vehicle_number]
     if behavior_row.empty:
@@ -101,12 +187,13 @@ def get_driver_risk_profile_by_id(db: Session, driver_id: int):
         JOIN trip_details td ON a.trip_id = td.trip_id
         WHERE a.alert_type = 'deviate' AND td.driver_id = :driver_id
     """)
-    route_deviation_count = db.execute(deviation_query, {"driver_id": driver_id}).scalar()
+    route_deviation_count = fetch_scalar(deviation_query, {"driver_id": driver_id}, replica=True,
+                                         name="driver_route_deviation")
 
     # Time deviation across trips
     trips_query = text("SELECT trip_id FROM trip_details WHERE driver_id = :driver_id")
-    trip_ids = [r[0] for r in db.execute(trips_query, {"driver_id": driver_id}).fetchall()]
-    time_deviation = sum(get_time_deviation(db, tid) for tid in trip_ids) / len(trip_ids) if trip_ids else 0
+    trip_ids = [r[0] for r in fetch_all(trips_query, {"driver_id": driver_id}, replica=True, name="driver_trips")]
+    time_deviation = sum(get_time_deviation(tid) for tid in trip_ids) / len(trip_ids) if trip_ids else 0
 
     # Risk scoring logic
     risk_score = 0
@@ -1,20 +1,24 @@
 import pandas as pd
-from sqlalchemy.orm import Session
+from app.db import read_sql
+from app.metrics import stage
+from app.reference_data import get_reference_data
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.cluster import KMeans
 from sklearn.metrics import silhouette_score
 from mlxtend.frequent_patterns import apriori, association_rules
 from mlxtend.preprocessing import TransactionEncoder
 
-# Load and prepare data using session
-def load_failure_data(session: Session):
+# Load and prepare failure data
+def load_failure_data():
     try:
         query = """
-            SELECT sr.replacement_id, sr.reason, sr.vehicle_id, v.vehicle_number
+            SELECT sr.replacement_id, sr.reason, sr.vehicle_id
             FROM spare_replacement sr
-            JOIN vehicle v ON sr.vehicle_id = v.vehicle_id
         """
-        df = pd.read_sql(query, session.bind).dropna()
+        df = read_sql(query, replica=True, name="failure_data")
+        # The vehicle join happens against the cached reference table
+        vehicles = get_reference_data().vehicles[["vehicle_id", "vehicle_number"]]
+        df = df.merge(vehicles, on="vehicle_id").dropna()
 
         # Create a dictionary of replacement_id -> reason
         replacement_dict = df[['replacement_id', 'reason']].drop_duplicates().set_index('replacement_id')['reason'].to_dict()
@@ -23,8 +27,13 @@ def load_failure_data(session: Session):
         print(f"Error loading failure data: {str(e)}")
         return pd.DataFrame(), {}
 
+# Raised between steps when the job running the analysis is cancelled or out of time
+def check_stop(should_stop):
+    if should_stop and should_stop():
+        raise InterruptedError("Failure analysis was stopped before it finished")
+
 # Dynamic clustering with optimal silhouette score
-def cluster_failure_reasons(filtered_df):
+def cluster_failure_reasons(filtered_df, should_stop=None):
     vectorizer = TfidfVectorizer(stop_words='english')
     X = vectorizer.fit_transform(filtered_df['reason'])
 
@@ -34,6 +43,7 @@ def cluster_failure_reasons(filtered_df):
     best_model = None
 
     for k in range(2, min(10, len(filtered_df))):
+        check_stop(should_stop)
         kmeans = KMeans(n_clusters=k, random_state=42, n_init='auto')
         labels = kmeans.fit_predict(X)
         score = silhouette_score(X, labels)
@@ -58,13 +68,14 @@ def cluster_failure_reasons(filtered_df):
     return cluster_data, best_score, filtered_df
 
 # Predict spare failures using Apriori
-def get_association_rules(filtered_df, replacement_dict, clusters=False):
+def get_association_rules(filtered_df, replacement_dict, clusters=False, should_stop=None):
     grouped = filtered_df.groupby('replacement_id').agg(list)
     transactions = grouped['reason'].apply(lambda x: list(set(x))).tolist()
 
     if not transactions or len(transactions) < 2:
         return []
 
+    check_stop(should_stop)
     te = TransactionEncoder()
     te_ary = te.fit(transactions).transform(transactions)
     df_te = pd.DataFrame(te_ary, columns=te.columns_)
@@ -73,6 +84,8 @@ def get_association_rules(filtered_df, replacement_dict, clusters=False):
     if frequent_itemsets.empty:
         return []
 
+    check_stop(should_stop)
+
     rules = association_rules(frequent_itemsets, metric="lift", min_threshold=1.0)
     if rules.empty:
         return []
@@ -91,8 +104,43 @@ def get_association_rules(filtered_df, replacement_dict, clusters=False):
         cluster_predictions = []
         for cluster in filtered_df['cluster'].unique():
             cluster_df = filtered_df[filtered_df['cluster'] == cluster]
-            cluster_rules = get_association_rules(cluster_df, replacement_dict)
+            cluster_rules = get_association_rules(cluster_df, replacement_dict, should_stop=should_stop)
             cluster_predictions.append((cluster, cluster_rules))
         return cluster_predictions
 
     return predicted_spares[:3]  # Limit to top 3
+
+# Cluster and predict failures for a single vehicle's records
+def analyze_vehicle_failures(filtered_df, replacement_dict, should_stop=None):
+    if len(filtered_df) < 2:
+        return {
+            "cluster_data": [],
+            "predictions": [],
+            "silhouette_score": 0,
+            "message": "Not enough data to perform clustering or rules"
+        }
+
+    with stage("fit"):
+        cluster_data, silhouette_avg, filtered_df_with_clusters = cluster_failure_reasons(filtered_df, should_stop)
+    with stage("predict"):
+        predictions = get_association_rules(filtered_df_with_clusters, replacement_dict, clusters=True,
+                                            should_stop=should_stop)
+
+    if not predictions and cluster_data:
+        predictions = [{"cluster": 0, "rules": [cluster_data[0]["highlight"]]}]
+
+    return {
+        "cluster_data": cluster_data,
+        "predictions": predictions,
+        "silhouette_score": silhouette_avg
+    }
+
+
+# Load the failure table and analyze one vehicle; None when it has no records
+def get_vehicle_failure_analysis(vehicle_number, should_stop=None):
+    df_failure_data, replacement_dict = load_failure_data()
+    check_stop(should_stop)
+    filtered_df = df_failure_data[df_failure_data["vehicle_number"] == vehicle_number]
+    if filtered_df.empty:
+        return None
+    return analyze_vehicle_failures(filtered_df, replacement_dict, should_stop)
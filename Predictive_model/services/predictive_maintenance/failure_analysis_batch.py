@@ -0,0 +1,163 @@
+import argparse
+import json
+import multiprocessing
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+import pandas as pd
+from sqlalchemy import inspect, text
+from app.db import get_engine, read_sql
+from services.predictive_maintenance.failure_analysis import analyze_vehicle_failures, load_failure_data
+
+RESULT_TABLE = "failure_analysis_result"
+
+
+def _to_json(value):
+    # numpy scalars (cluster ids, scores) are not JSON serializable as-is
+    return json.dumps(value, default=lambda o: o.item() if hasattr(o, "item") else str(o))
+
+
+# Runs inside a worker process, so it must stay a top-level function
+def analyze_vehicle_partition(vehicle_number, vehicle_df, replacement_dict):
+    started = time.perf_counter()
+    try:
+        analysis = analyze_vehicle_failures(vehicle_df, replacement_dict)
+        status, error = "success", None
+    except Exception as e:
+        analysis, status, error = {}, "failed", str(e)
+
+    return {
+        "vehicle_number": vehicle_number,
+        "record_count": len(vehicle_df),
+        "status": status,
+        "cluster_data": _to_json(analysis.get("cluster_data", [])),
+        "predictions": _to_json(analysis.get("predictions", [])),
+        "silhouette_score": float(analysis.get("silhouette_score", 0)),
+        "message": analysis.get("message"),
+        "error": error,
+        "duration_ms": round((time.perf_counter() - started) * 1000, 2)
+    }
+
+
+def save_batch_results(results_df: pd.DataFrame):
+    results_df.to_sql(RESULT_TABLE, get_engine(), if_exists="append", index=False)
+
+
+def _save_rows(run_id, rows):
+    save_batch_results(pd.DataFrame([{"run_id": run_id, **row, "created_on": datetime.now()} for row in rows]))
+
+
+def _stopped_result(vehicle_number, vehicle_df):
+    return {
+        "vehicle_number": vehicle_number,
+        "record_count": len(vehicle_df),
+        "status": "stopped",
+        "cluster_data": _to_json([]),
+        "predictions": _to_json([]),
+        "silhouette_score": 0.0,
+        "message": None,
+        "error": "Batch run was stopped before this vehicle was processed",
+        "duration_ms": None
+    }
+
+
+def run_fleet_failure_analysis(max_workers=None, save_results=True, should_stop=None):
+    run_id = uuid.uuid4().hex
+    started = time.perf_counter()
+
+    # Load spare_replacement once for the whole fleet
+    df_failure_data, replacement_dict = load_failure_data()
+
+    load_ms = round((time.perf_counter() - started) * 1000, 2)
+    results = []
+
+    if not df_failure_data.empty:
+        # Called from a threaded web or job process: forking that could copy a held lock into the
+        # children, so they start from a clean forkserver instead
+        with ProcessPoolExecutor(max_workers=max_workers,
+                                 mp_context=multiprocessing.get_context("forkserver")) as executor:
+            futures = {}
+            for vehicle_number, vehicle_df in df_failure_data.groupby("vehicle_number"):
+                # Only ship the replacements that belong to this vehicle to the worker
+                vehicle_replacements = {
+                    rid: replacement_dict[rid]
+                    for rid in vehicle_df["replacement_id"].unique() if rid in replacement_dict
+                }
+                future = executor.submit(analyze_vehicle_partition, vehicle_number,
+                                         vehicle_df.copy(), vehicle_replacements)
+                futures[future] = (vehicle_number, vehicle_df)
+
+            # Each vehicle is saved as soon as it is done, so a stopped run keeps what it finished
+            for future in as_completed(futures):
+                result = future.result()
+                results.append(result)
+                if save_results:
+                    _save_rows(run_id, [result])
+
+                if should_stop and should_stop() and len(results) < len(futures):
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    finished = {row["vehicle_number"] for row in results}
+                    stopped = [
+                        _stopped_result(vehicle_number, vehicle_df)
+                        for vehicle_number, vehicle_df in futures.values() if vehicle_number not in finished
+                    ]
+                    if save_results:
+                        _save_rows(run_id, stopped)
+                    raise InterruptedError(f"Batch run {run_id} was stopped after {len(results)} of "
+                                           f"{len(futures)} vehicles; finished vehicles are saved")
+
+    failed = [row for row in results if row["status"] == "failed"]
+
+    return {
+        "run_id": run_id,
+        "vehicle_count": len(results),
+        "succeeded": len(results) - len(failed),
+        "failed": len(failed),
+        "load_ms": load_ms,
+        "total_ms": round((time.perf_counter() - started) * 1000, 2),
+        "vehicles": [
+            {
+                "vehicle_number": row["vehicle_number"],
+                "status": row["status"],
+                "duration_ms": row["duration_ms"],
+                "error": row["error"]
+            }
+            for row in results
+        ]
+    }
+
+
+def fetch_batch_results(run_id):
+    if not inspect(get_engine()).has_table(RESULT_TABLE):
+        return []
+
+    query = text(f"""
+        SELECT run_id, vehicle_number, record_count, status, cluster_data, predictions,
+               silhouette_score, message, error, duration_ms, created_on
+        FROM {RESULT_TABLE}
+        WHERE run_id = :run_id
+        ORDER BY vehicle_number
+    """)
+    df = read_sql(query, params={"run_id": run_id}, name="failure_batch_results")
+
+    df["cluster_data"] = df["cluster_data"].apply(json.loads)
+    df["predictions"] = df["predictions"].apply(json.loads)
+    df["created_on"] = df["created_on"].astype(str)
+    df = df.astype(object).where(pd.notnull(df), None)
+    return df.to_dict(orient="records")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run failure analysis for every vehicle in the fleet")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes")
+    parser.add_argument("--dry-run", action="store_true", help="Do not write results to the result table")
+    args = parser.parse_args()
+
+    summary = run_fleet_failure_analysis(max_workers=args.workers, save_results=not args.dry_run)
+    print(f"Run {summary['run_id']}: {summary['succeeded']} succeeded, {summary['failed']} failed "
+          f"in {summary['total_ms']} ms (load {summary['load_ms']} ms)")
+    for vehicle in summary["vehicles"]:
+        if vehicle["status"] == "failed":
+            print(f"  {vehicle['vehicle_number']}: {vehicle['error']}")
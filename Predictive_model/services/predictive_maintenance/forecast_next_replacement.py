@@ -1,15 +1,18 @@
 import pandas as pd
 from prophet import Prophet
 from sqlalchemy import text
-from app.config import SessionLocal
+from app import tracking_mirror
+from app.db import read_sql
+from app.metrics import stage
+from app.model_store import PROPHET_MODEL_DIR, get_pickled_model, put_model
+from app.reference_data import get_reference_data
 import numpy as np
 import os
 import pickle
 import json
 from datetime import datetime
 
-MODEL_DIR = "prophet_models"
-os.makedirs(MODEL_DIR, exist_ok=True)
+MODEL_DIR = PROPHET_MODEL_DIR
 
 def is_model_stale(meta_path):
     if not os.path.exists(meta_path):
@@ -26,26 +29,24 @@ def update_model_metadata(meta_path):
 
 
 def fetch_replacement_history() -> pd.DataFrame:
-    session = SessionLocal()
-    try:
-        query = text("""
-            SELECT 
-                s.replaced_on,
-                s.vehicle_id,
-                s.spares_inventory_depot_id AS spare_id
-            FROM spare_replacement s
-            WHERE s.replaced_on IS NOT NULL
-            ORDER BY s.vehicle_id, s.spares_inventory_depot_id, s.replaced_on
-        """)
-        df = pd.read_sql(query, session.bind)
-    finally:
-        session.close()
+    query = text("""
+        SELECT 
+            s.replaced_on,
+            s.vehicle_id,
+            s.spares_inventory_depot_id AS spare_id
+        FROM spare_replacement s
+        WHERE s.replaced_on IS NOT NULL
+        ORDER BY s.vehicle_id, s.spares_inventory_depot_id, s.replaced_on
+    """)
+    df = read_sql(query, replica=True, name="replacement_history")
     return df
 
 
 def fetch_tracking_data() -> pd.DataFrame:
-    session = SessionLocal()
-    try:
+    if tracking_mirror.is_available():
+        df = tracking_mirror.read_tracking(columns=["vehicle_reg_no", "vehicle_timestamp", "speed"])
+        df = df[df["speed"] > 0].sort_values(["vehicle_reg_no", "vehicle_timestamp"]).reset_index(drop=True)
+    else:
         query = text("""
             SELECT
                 vehicle_reg_no,
@@ -55,13 +56,12 @@ def fetch_tracking_data() -> pd.DataFrame:
             WHERE speed > 0
             ORDER BY vehicle_reg_no, vehicle_timestamp
         """)
-        df = pd.read_sql(query, session.bind)
-    finally:
-        session.close()
+        df = read_sql(query, replica=True, name="tracking_usage")
 
-    df["vehicle_timestamp"] = pd.to_datetime(df["vehicle_timestamp"])
-    df["time_diff"] = df.groupby("vehicle_reg_no")["vehicle_timestamp"].diff().dt.total_seconds() / 3600
-    df["usage_hours"] = df["speed"] * df["time_diff"]
+    with stage("transform"):
+        df["vehicle_timestamp"] = pd.to_datetime(df["vehicle_timestamp"])
+        df["time_diff"] = df.groupby("vehicle_reg_no")["vehicle_timestamp"].diff().dt.total_seconds() / 3600
+        df["usage_hours"] = df["speed"] * df["time_diff"]
     return df
 
 
@@ -95,55 +95,39 @@ def compute_usage_before_replacement(replacement_df: pd.DataFrame, tracking_df:
 
 
 
-def fetch_spare_inventory_data():
-    session = SessionLocal()
-    try:
-        query = text("""
-            SELECT
-                spare_id,
-                spare_name,
-                unit_price,
-                quantity_available
-            FROM spares_inventory_depot
-        """)
-        return pd.read_sql(query, session.bind)
-    finally:
-        session.close()
-
-
 def fetch_vehicle_status_data():
-    session = SessionLocal()
-    try:
-        query = text("""
-            SELECT
-                vehicle_reg_no,
-                AVG(emergency_status::int) AS emergency_condition,
-                AVG(CASE WHEN tamper_alert = 'O' THEN 1 ELSE 0 END) AS tamper_condition
-            FROM tracking_data
-            GROUP BY vehicle_reg_no
-        """)
-        return pd.read_sql(query, session.bind)
-    finally:
-        session.close()
+    if tracking_mirror.is_available():
+        df = tracking_mirror.read_tracking(columns=["vehicle_reg_no", "emergency_status", "tamper_alert"])
+        with stage("transform"):
+            df["emergency_condition"] = pd.to_numeric(df["emergency_status"].replace({True: 1, False: 0}),
+                                                      errors="coerce")
+            df["tamper_condition"] = (df["tamper_alert"] == 'O').astype(int)
+            return df.groupby("vehicle_reg_no", as_index=False)[["emergency_condition", "tamper_condition"]].mean()
+
+    query = text("""
+        SELECT
+            vehicle_reg_no,
+            AVG(emergency_status::int) AS emergency_condition,
+            AVG(CASE WHEN tamper_alert = 'O' THEN 1 ELSE 0 END) AS tamper_condition
+        FROM tracking_data
+        GROUP BY vehicle_reg_no
+    """)
+    return read_sql(query, replica=True, name="vehicle_status")
 
 
 def fetch_vehicle_reg_no():
-    session = SessionLocal()
-    try:
-        query = text("""
-            SELECT
-                vehicle_id,
-                vehicle_number AS vehicle_reg_no
-            FROM vehicle
-        """)
-        return pd.read_sql(query, session.bind)
-    finally:
-        session.close()
+    vehicles = get_reference_data().vehicles
+    return vehicles[["vehicle_id", "vehicle_number"]].rename(columns={"vehicle_number": "vehicle_reg_no"})
 
 
-def generate_forecast_for_pair(df, spare_inventory, vehicle_status, periods=60):
-    df = df.merge(spare_inventory, on="spare_id", how="left")
-    df = df.merge(vehicle_status, on="vehicle_reg_no", how="left")
+# spare and vehicle_status are this pair's lookup rows, or None when the pair has no match
+def generate_forecast_for_pair(df, spare, vehicle_status, periods=60):
+    df = df.assign(
+        unit_price=spare["unit_price"] if spare else np.nan,
+        quantity_available=spare["quantity_available"] if spare else np.nan,
+        emergency_condition=vehicle_status["emergency_condition"] if vehicle_status else np.nan,
+        tamper_condition=vehicle_status["tamper_condition"] if vehicle_status else np.nan
+    )
 
     df = df.sort_values("replaced_on")
     ts = df[["replaced_on", "usage_before_replacement"]].rename(columns={"replaced_on": "ds", "usage_before_replacement": "y"})
@@ -162,8 +146,8 @@ def generate_forecast_for_pair(df, spare_inventory, vehicle_status, periods=60):
     meta_path = os.path.join(MODEL_DIR, f"prophet_model_{vehicle_id}_{spare_id}_meta.json")
 
     if os.path.exists(model_path) and not is_model_stale(meta_path):
-        with open(model_path, "rb") as f:
-            model = pickle.load(f)
+        with stage("model_load"):
+            model = get_pickled_model(model_path)
     else:
         model = Prophet(daily_seasonality=False, yearly_seasonality=False, weekly_seasonality=False)
         model.add_regressor("cost")
@@ -171,10 +155,13 @@ def generate_forecast_for_pair(df, spare_inventory, vehicle_status, periods=60):
         model.add_regressor("emergency_condition")
         model.add_regressor("tamper_condition")
 
-        model.fit(ts)
+        with stage("fit"):
+            model.fit(ts)
 
+        os.makedirs(MODEL_DIR, exist_ok=True)
         with open(model_path, "wb") as f:
             pickle.dump(model, f)
+        put_model(model_path, model)
         update_model_metadata(meta_path)
 
     future = model.make_future_dataframe(periods=periods)
@@ -183,14 +170,15 @@ def generate_forecast_for_pair(df, spare_inventory, vehicle_status, periods=60):
     future["emergency_condition"] = df["emergency_condition"].iloc[-1]
     future["tamper_condition"] = df["tamper_condition"].iloc[-1]
 
-    forecast = model.predict(future)
+    with stage("predict"):
+        forecast = model.predict(future)
     forecasted = forecast[forecast['ds'] > ts['ds'].max()]
     next_date = forecasted.loc[forecasted['yhat'] > 0.5, 'ds']
 
     return next_date.min() if not next_date.empty else None
 
 
-def forecast_all_next_replacements(periods: int = 60):
+def forecast_all_next_replacements(periods: int = 60, should_stop=None):
     history_df = fetch_replacement_history()
     vehicle_reg_no_df = fetch_vehicle_reg_no()
     tracking_df = fetch_tracking_data()
@@ -198,21 +186,26 @@ def forecast_all_next_replacements(periods: int = 60):
     # Merge vehicle_reg_no into history
     history_df = history_df.merge(vehicle_reg_no_df, on="vehicle_id", how="left")
 
-    spare_inventory_df = fetch_spare_inventory_data()
+    spare_by_id = get_reference_data().spare_by_id
     vehicle_status_df = fetch_vehicle_status_data()
+    status_by_reg_no = vehicle_status_df.set_index("vehicle_reg_no")[
+        ["emergency_condition", "tamper_condition"]
+    ].to_dict(orient="index")
 
-    history_with_usage = compute_usage_before_replacement(history_df, tracking_df)
+    with stage("transform"):
+        history_with_usage = compute_usage_before_replacement(history_df, tracking_df)
     results = []
 
     grouped = history_with_usage.groupby(["vehicle_id", "spare_id"])
     for (vehicle_id, spare_id), group_df in grouped:
+        if should_stop and should_stop():
+            raise InterruptedError("Forecast run was stopped before all pairs were processed")
         try:
-            next_date = generate_forecast_for_pair(group_df, spare_inventory_df,
-                                                   vehicle_status_df, periods)
-
-            spare_row = spare_inventory_df[spare_inventory_df['spare_id'] == spare_id].iloc[0]
+            spare_row = spare_by_id[spare_id]
             vehicle_reg_no = group_df['vehicle_reg_no'].iloc[0]
-            status_row = vehicle_status_df[vehicle_status_df['vehicle_reg_no'] == vehicle_reg_no]
+            status_row = status_by_reg_no.get(vehicle_reg_no)
+
+            next_date = generate_forecast_for_pair(group_df, spare_row, status_row, periods)
 
             usage_before_last = group_df["usage_before_replacement"].dropna().iloc[-1] \
                                 if not group_df["usage_before_replacement"].dropna().empty else None
@@ -224,8 +217,8 @@ def forecast_all_next_replacements(periods: int = 60):
                 "unit_price": round(spare_row["unit_price"], 2),
                 "quantity_available": round(spare_row["quantity_available"], 2),
                 "usage_before_last_replacement": round(usage_before_last, 2) if usage_before_last is not None else None,
-                "emergency_condition": round(status_row["emergency_condition"].values[0], 2) if not status_row.empty else None,
-                "tamper_condition": round(status_row["tamper_condition"].values[0], 2) if not status_row.empty else None
+                "emergency_condition": round(status_row["emergency_condition"], 2) if status_row else None,
+                "tamper_condition": round(status_row["tamper_condition"], 2) if status_row else None
             })
         except Exception as e:
             print(f"Skipping vehicle {vehicle_id}, spare {spare_id}: {e}")
@@ -1,8 +1,6 @@
 import pandas as pd
 from sklearn.ensemble import IsolationForest
 import joblib
-from sqlalchemy import text
-from app.config import engine
 from services.vehicle_health_monitor.utils import fetch_tracking_data, preprocess
 
 
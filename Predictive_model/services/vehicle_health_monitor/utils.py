@@ -1,7 +1,8 @@
 # utils.py
 import pandas as pd
-from sqlalchemy import text
-from app.config import engine
+from sqlalchemy import bindparam, text
+from app import tracking_mirror
+from app.db import fetch_scalar, read_sql
 
 '''
 def fetch_tracking_data():
@@ -15,7 +16,23 @@ def fetch_tracking_data():
     return pd.read_sql_query(query, engine, parse_dates=['created_on', 'vehicle_timestamp'])
 '''
 
+HEALTH_COLUMNS = [
+    'vehicle_reg_no', 'main_input_voltage', 'internal_battery_voltage',
+    'main_power_status', 'ignition_status', 'gps_fix', 'tamper_alert', 'emergency_status',
+    'created_on', 'vehicle_timestamp'
+]
+
+
 def fetch_tracking_data(vehicle_reg_no=None):
+    if tracking_mirror.is_available():
+        # Same 7-day window, anchored on the newest timestamp the mirror has seen
+        watermark = tracking_mirror.read_watermark()
+        if not watermark.get("max_vehicle_timestamp"):
+            return pd.DataFrame(columns=HEALTH_COLUMNS)
+        start = pd.Timestamp(watermark["max_vehicle_timestamp"]) - pd.Timedelta(days=7)
+        df = tracking_mirror.read_tracking(columns=HEALTH_COLUMNS, vehicle_reg_no=vehicle_reg_no or None, start=start)
+        return df.sort_values(['vehicle_reg_no', 'vehicle_timestamp']).reset_index(drop=True)
+
     base_query = """
     SELECT vehicle_reg_no, main_input_voltage, internal_battery_voltage, 
            main_power_status, ignition_status, gps_fix, tamper_alert, emergency_status, 
@@ -28,7 +45,45 @@ def fetch_tracking_data(vehicle_reg_no=None):
 
     params = {"vehicle_reg_no": vehicle_reg_no} if vehicle_reg_no else {}
 
-    return pd.read_sql_query(text(base_query), engine, params=params, parse_dates=['created_on', 'vehicle_timestamp'])
+    return read_sql(base_query, params=params, replica=True, name="vehicle_health_tracking",
+                    parse_dates=['created_on', 'vehicle_timestamp'])
+
+
+def latest_tracking_timestamp():
+    if tracking_mirror.is_available():
+        watermark = tracking_mirror.read_watermark()
+        return pd.Timestamp(watermark["max_vehicle_timestamp"]) if watermark.get("max_vehicle_timestamp") else None
+    value = fetch_scalar("SELECT MAX(vehicle_timestamp) FROM tracking_data", replica=True,
+                         name="latest_tracking_timestamp")
+    return pd.Timestamp(value) if value is not None else None
+
+
+def fetch_tracking_range(vehicle_reg_nos, start=None, end=None):
+    # Rows for a batch of vehicles, ordered so per-vehicle shifts in preprocess stay within a vehicle
+    if tracking_mirror.is_available():
+        df = tracking_mirror.read_tracking(columns=HEALTH_COLUMNS, vehicle_reg_no=list(vehicle_reg_nos),
+                                           start=start, end=end)
+        return df.sort_values(['vehicle_reg_no', 'vehicle_timestamp']).reset_index(drop=True)
+
+    query = """
+    SELECT vehicle_reg_no, main_input_voltage, internal_battery_voltage,
+           main_power_status, ignition_status, gps_fix, tamper_alert, emergency_status,
+           created_on, vehicle_timestamp
+    FROM tracking_data
+    WHERE vehicle_reg_no IN :vehicle_reg_nos
+    """
+    params = {"vehicle_reg_nos": list(vehicle_reg_nos)}
+    if start is not None:
+        query += " AND vehicle_timestamp >= :start"
+        params["start"] = pd.Timestamp(start).to_pydatetime()
+    if end is not None:
+        query += " AND vehicle_timestamp <= :end"
+        params["end"] = pd.Timestamp(end).to_pydatetime()
+    query += " ORDER BY vehicle_reg_no, vehicle_timestamp"
+
+    statement = text(query).bindparams(bindparam("vehicle_reg_nos", expanding=True))
+    return read_sql(statement, params=params, replica=True, name="vehicle_health_tracking_batch",
+                    parse_dates=['created_on', 'vehicle_timestamp'])
 
 
 def preprocess(df):
@@ -1,30 +1,37 @@
 import pandas as pd
 import numpy as np
-from sqlalchemy import text
-from app.config import engine
 from datetime import datetime
-import joblib
 import os
 
-from services.vehicle_health_monitor.utils import fetch_tracking_data, preprocess
+from app.reference_data import get_reference_data
+from app.metrics import stage
+from app.model_store import VEHICLE_HEALTH_MODEL_PATH, get_model
+from services.vehicle_health_monitor.utils import (
+    fetch_tracking_data, fetch_tracking_range, latest_tracking_timestamp, preprocess
+)
 
 
-MODEL_PATH = "models/vehicle_health_iforest.pkl"
+MODEL_PATH = VEHICLE_HEALTH_MODEL_PATH
 
+FEATURES = [
+    'low_main_voltage', 'low_internal_battery', 'power_fluctuations',
+    'ignition_cycles', 'gps_unreliable', 'time_drift',
+    'tamper_flag', 'emergency_flag'
+]
 
-def detect_anomalies(agg_df, model_path=MODEL_PATH):
-    features = [
-        'low_main_voltage', 'low_internal_battery', 'power_fluctuations',
-        'ignition_cycles', 'gps_unreliable', 'time_drift',
-        'tamper_flag', 'emergency_flag'
-    ]
 
+def detect_anomalies(agg_df, model_path=MODEL_PATH):
     if not os.path.exists(model_path):
         raise FileNotFoundError(f"Model file not found at {model_path}. Please train it first.")
 
-    model = joblib.load(model_path)
-    X = agg_df[features]
-    agg_df['anomaly_score'] = model.predict(X)
+    with stage("model_load"):
+        model = get_model(model_path)
+    X = agg_df[FEATURES]
+    with stage("predict"):
+        # IsolationForest.predict is just decision_function < 0, so score once and derive the label
+        decision_scores = model.decision_function(X)
+    agg_df['decision_score'] = decision_scores
+    agg_df['anomaly_score'] = np.where(decision_scores < 0, -1, 1)
     agg_df['health_status'] = agg_df['anomaly_score'].map({1: 'Healthy', -1: 'At Risk'})
     return agg_df
 
@@ -33,7 +40,8 @@ def get_vehicle_health_json(vehicle_reg_no=None):
     if df.empty:
         return []
 
-    agg_df = preprocess(df)
+    with stage("transform"):
+        agg_df = preprocess(df)
     if agg_df.empty:
         return []
 
@@ -41,4 +49,37 @@ def get_vehicle_health_json(vehicle_reg_no=None):
 
     result_df['date'] = result_df['date'].astype(str)
     result_json = result_df[['vehicle_reg_no', 'date', 'health_status','anomaly_score']].to_dict(orient='records')
-    return result_json
\ No newline at end of file
+    return result_json
+
+
+def fetch_fleet_vehicle_numbers():
+    return get_reference_data().vehicle_numbers()
+
+
+# Scores vehicles batch by batch and yields each batch's records as soon as it is ready, so the
+# first bytes go out after one batch no matter how large the fleet or the date range is
+def iter_vehicle_health_batches(vehicle_reg_nos=None, start=None, end=None, batch_size=50):
+    if start is None:
+        # Same default window as get_vehicle_health_json: the last 7 days of data
+        latest = latest_tracking_timestamp()
+        if latest is None:
+            return
+        start = latest - pd.Timedelta(days=7)
+
+    vehicle_reg_nos = vehicle_reg_nos or fetch_fleet_vehicle_numbers()
+    for offset in range(0, len(vehicle_reg_nos), batch_size):
+        batch = vehicle_reg_nos[offset:offset + batch_size]
+        df = fetch_tracking_range(batch, start=start, end=end)
+        if df.empty:
+            continue
+
+        with stage("transform"):
+            agg_df = preprocess(df)
+        if agg_df.empty:
+            continue
+
+        result_df = detect_anomalies(agg_df)
+        result_df['date'] = result_df['date'].astype(str)
+        yield result_df[['vehicle_reg_no', 'date', 'health_status', 'anomaly_score', 'decision_score']].to_dict(
+            orient='records'
+        )
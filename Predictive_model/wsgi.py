@@ -0,0 +1,11 @@
+import gc
+
+from app.warmup import run_warmup
+from main import app
+
+# Load heavy modules and models once here. With preload_app the master imports this
+# module before forking, so workers share these pages copy-on-write.
+warmup_timings = run_warmup()
+
+# Keep the preloaded objects out of the collector so it does not touch (and copy) their pages
+gc.freeze()
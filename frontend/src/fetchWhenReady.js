@@ -0,0 +1,12 @@
+// Long analytics runs answer 202 with a Location to poll; resolve with the final response
+const fetchWhenReady = async (url, options = {}, interval = 2000) => {
+  let res = await fetch(url, options);
+  while (res.status === 202 && res.headers.get("Location")) {
+    const next = new URL(res.headers.get("Location"), url).toString();
+    await new Promise((resolve) => setTimeout(resolve, interval));
+    res = await fetch(next, options);
+  }
+  return res;
+};
+
+export default fetchWhenReady;
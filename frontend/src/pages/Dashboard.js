@@ -19,6 +19,7 @@ import {
 } from "recharts";
 import { Gantt, Task } from "gantt-task-react";
 import "gantt-task-react/dist/index.css";
+import fetchWhenReady from "../fetchWhenReady";
 
 const HeatmapLayer = ({ points }) => {
   const map = useMap();
@@ -144,7 +145,7 @@ const Dashboard = () => {
 
   const fetchGanttTasks = useCallback(async (vehicleNumber) => {
     try {
-      const res = await fetch("http://localhost:5000/predictive_maintenance");
+      const res = await fetchWhenReady("http://localhost:5000/predictive_maintenance");
       const data = await res.json();
       const filtered = data
         .filter((item) => item.vehicle_reg_no === vehicleNumber)
@@ -201,7 +202,7 @@ const Dashboard = () => {
 
   const fetchFailureAnalysis = useCallback(async (vehicleNumber) => {
     try {
-      const res = await fetch(
+      const res = await fetchWhenReady(
         `http://localhost:5000/failure-analysis?vehicle_number=${vehicleNumber}`
       );
       const data = await res.json();
@@ -1,5 +1,6 @@
 import React, { useEffect, useState, useCallback } from "react";
 import { PieChart, Pie, Cell, Tooltip, Legend } from "recharts";
+import fetchWhenReady from "../fetchWhenReady";
 
 const COLORS = [
   "#0088FE",
@@ -35,7 +36,7 @@ const FailureAnalysisChart = () => {
 
   const fetchFailureAnalysis = useCallback(async (vehicleNumber) => {
     try {
-      const res = await fetch(
+      const res = await fetchWhenReady(
         `http://localhost:5000/failure-analysis?vehicle_number=${vehicleNumber}`
       );
       const data = await res.json();
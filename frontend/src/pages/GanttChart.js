@@ -1,12 +1,13 @@
 import React, { useEffect, useState } from "react";
 import { Gantt, Task } from "gantt-task-react";
 import "gantt-task-react/dist/index.css";
+import fetchWhenReady from "../fetchWhenReady";
 
 const GanttChart = () => {
   const [tasks, setTasks] = useState([]);
 
   useEffect(() => {
-    fetch("http://127.0.0.1:5000/predictive_maintenance")
+    fetchWhenReady("http://127.0.0.1:5000/predictive_maintenance")
       .then((res) => res.json())
       .then((data) => {
         const ganttTasks = data
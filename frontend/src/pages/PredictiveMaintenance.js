@@ -1,4 +1,5 @@
 import React, { useEffect, useState } from "react";
+import fetchWhenReady from "../fetchWhenReady";
 
 const PredictiveMaintenanceTable = () => {
   const [data, setData] = useState([]);
@@ -10,7 +11,7 @@ const PredictiveMaintenanceTable = () => {
   const fetchData = async () => {
     setLoading(true);
     try {
-      const res = await fetch("http://127.0.0.1:5000/predictive_maintenance");
+      const res = await fetchWhenReady("http://127.0.0.1:5000/predictive_maintenance");
       const json = await res.json();
       setData(json);
       setFiltered(json);